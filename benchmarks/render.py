@@ -0,0 +1,261 @@
+"""Headless render benchmark for every window type and drawing primitive.
+
+Each case draws one frame per iteration on a headless Screen (reset,
+draw calls, final) for several window sizes and element counts, and
+reports frames per second, per-frame and per-call latency percentiles,
+and memory use per frame. Memory is measured with tracemalloc, so only
+the Python heap is seen (not pixel buffers allocated by SDL): retained
+is the number of blocks still allocated per frame (leaks), and churn is
+how far the traced memory rises above its level at the start of a
+frame (temporaries allocated and freed during the frame).
+
+    $ python benchmarks/render.py
+    $ python benchmarks/render.py --sizes 1920x1080 --counts 10,200 --json results.json
+"""
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import numpy
+import pygame
+from pygame_teleop.screen import Screen
+from pygame_teleop.joystick import Joystick
+from pygame_teleop.profiling import DRAWING_METHODS
+
+
+def screen_config(width, height, window_type, **window_config):
+    config = {
+        'width': width,
+        'height': height,
+        'background_color': 'darkslateblue',
+        'headless': True,
+        'windows': {},
+    }
+    if window_type is not None:
+        config['windows']['win'] = dict(
+            origin=(0, 0),
+            width=width,
+            height=height,
+            background_color='white',
+            type=window_type,
+            **window_config,
+        )
+    return config
+
+
+def robotenv_config(width, height, **kwargs):
+    return screen_config(
+        width, height, 'RobotEnvironment',
+        robotenv_width=1.0,
+        robotenv_height=float(height)/float(width),
+        robotenv_origin_location='lower_left',
+        **kwargs,
+    )
+
+
+# Cases, each returns (config, draw) where draw(screen, frame) draws
+# a single frame between reset and final
+
+
+def case_screen(width, height, n):
+    return screen_config(width, height, None), lambda screen, k: None
+
+
+def case_robots(width, height, n):
+    robots = {f'robot{i}': {'robot_radius': 0.01, 'robot_color': 'blue', 'show_path': True} for i in range(n)}
+    rng = numpy.random.default_rng(0)
+    x0 = rng.uniform(0.1, 0.9, (n, 2))*[1.0, float(height)/float(width)]
+    def draw(screen, k):
+        env = screen.windows['win']
+        for i, robot in enumerate(env.robots.values()):
+            robot.draw(x0[i] + 0.05*numpy.array([numpy.cos(0.1*k), numpy.sin(0.1*k)]))
+    return robotenv_config(width, height, robots=robots), draw
+
+
+def case_draw_robots(width, height, n):
+    rng = numpy.random.default_rng(0)
+    x0 = rng.uniform(0.1, 0.9, (2, n))*[[1.0], [float(height)/float(width)]]
+    def draw(screen, k):
+        offset = 0.05*numpy.array([[numpy.cos(0.1*k)], [numpy.sin(0.1*k)]])
+        screen.windows['win'].draw_robots(x0 + offset, 'blue', 0.01, path_color='black')
+    return robotenv_config(width, height), draw
+
+
+def case_joystick(width, height, n):
+    size = min(width, height)
+    def draw(screen, k):
+        axes = Joystick.isometric((numpy.cos(0.1*k), numpy.sin(0.1*k)))
+        screen.windows['win'].draw(axes)
+    return screen_config(size, size, 'Joystick'), draw
+
+
+def case_timeseries(width, height, n):
+    config = screen_config(width, height, 'TimeSeries', tp=2.0, tf=1.0, y_lo=-1.0, y_up=1.0, n=n)
+    t = numpy.linspace(-2.0, 0.0, 1000)
+    def draw(screen, k):
+        screen.windows['win'].plot_line(t, 0.8*numpy.sin(5*t + 0.1*k), 'red')
+    return config, draw
+
+
+def _primitive_case(draw_primitive):
+    def case(width, height, n):
+        rng = numpy.random.default_rng(0)
+        points = (rng.uniform(0.0, 1.0, (n, 2))*[width, height]).round().astype(int).tolist()
+        def draw(screen, k):
+            draw_primitive(screen, points, k)
+        return screen_config(width, height, None), draw
+    return case
+
+
+case_circle = _primitive_case(lambda screen, points, k: [screen.circle('red', p, 10) for p in points])
+case_line = _primitive_case(lambda screen, points, k: [screen.line('red', p, (p[0] + 50, p[1] + 20), 2) for p in points])
+case_lines = _primitive_case(lambda screen, points, k: screen.lines('red', points, 2))
+case_dashed_lines = _primitive_case(lambda screen, points, k: screen.dashed_lines('red', points, 2))
+case_rectangle = _primitive_case(lambda screen, points, k: [screen.rectangle('red', 40, 20, p) for p in points])
+case_rectangle_rotated = _primitive_case(lambda screen, points, k: [screen.rectangle('red', 40, 20, p, rotation=k + i) for i, p in enumerate(points)])
+case_rectangle_alpha = _primitive_case(lambda screen, points, k: [screen.rectangle('red', 40, 20, p, rotation=k + i, alpha=128) for i, p in enumerate(points)])
+
+
+CASES = {
+    'screen': case_screen,
+    'robots': case_robots,
+    'draw_robots': case_draw_robots,
+    'joystick': case_joystick,
+    'timeseries': case_timeseries,
+    'circle': case_circle,
+    'line': case_line,
+    'lines': case_lines,
+    'dashed_lines': case_dashed_lines,
+    'rectangle': case_rectangle,
+    'rectangle_rotated': case_rectangle_rotated,
+    'rectangle_alpha': case_rectangle_alpha,
+}
+
+
+def run_case(case, width, height, n, frames, warmup=10):
+
+    config, draw = CASES[case](width, height, n)
+    screen = Screen(config)
+
+    def frame(k):
+        screen.reset()
+        draw(screen, k)
+        screen.final()
+
+    # Latency
+    for k in range(warmup):
+        frame(k)
+    times = numpy.empty(frames)
+    for k in range(frames):
+        t0 = time.perf_counter()
+        frame(warmup + k)
+        times[k] = time.perf_counter() - t0
+
+    # Per-call latency, measured in a separate pass since the wrapped
+    # drawing methods add some overhead to every call
+    call_times = []
+    viewers = [screen] + list(screen.windows.values())
+    originals = [_time_calls(viewer, call_times) for viewer in viewers]
+    for k in range(frames):
+        frame(warmup + frames + k)
+    for viewer, methods in zip(viewers, originals):
+        for name, method in methods.items():
+            setattr(viewer, name, method)
+    calls = numpy.array(call_times) if call_times else numpy.zeros(1)
+
+    # Memory, measured in a separate pass since tracing slows down every allocation
+    n_alloc = min(frames, 20)
+    churn = numpy.empty(n_alloc)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for k in range(n_alloc):
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        frame(warmup + 2*frames + k)
+        _, peak = tracemalloc.get_traced_memory()
+        churn[k] = peak - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    retained = sum(max(stat.count_diff, 0) for stat in stats)
+
+    return {
+        'case': case,
+        'width': width,
+        'height': height,
+        'n': n,
+        'frames': frames,
+        'fps': float(1.0/times.mean()),
+        'p50_ms': float(1e3*numpy.percentile(times, 50)),
+        'p90_ms': float(1e3*numpy.percentile(times, 90)),
+        'p99_ms': float(1e3*numpy.percentile(times, 99)),
+        'max_ms': float(1e3*times.max()),
+        'calls_per_frame': len(call_times)/frames,
+        'call_p50_us': float(1e6*numpy.percentile(calls, 50)),
+        'call_p99_us': float(1e6*numpy.percentile(calls, 99)),
+        'retained_blocks_per_frame': retained/n_alloc,
+        'churn_kib_per_frame': float(churn.mean()/1024.0),
+    }
+
+
+def _time_calls(viewer, call_times):
+    """Wraps the drawing methods of viewer so the duration of every (outermost) call is appended to call_times, returns the original methods."""
+    depth = [0]
+    def timed(method):
+        def wrapper(*args, **kwargs):
+            if depth[0]:
+                return method(*args, **kwargs)
+            depth[0] += 1
+            t0 = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                call_times.append(time.perf_counter() - t0)
+                depth[0] -= 1
+        return wrapper
+    originals = {}
+    for name in DRAWING_METHODS:
+        method = getattr(viewer, name, None)
+        if method is not None:
+            originals[name] = method
+            setattr(viewer, name, timed(method))
+    return originals
+
+
+def parse_sizes(sizes):
+    return [tuple(int(d) for d in size.split('x')) for size in sizes.split(',')]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', default=','.join(CASES), help="comma separated cases, default all")
+    parser.add_argument('--sizes', default='640x480,1920x1080', help="comma separated window sizes WxH")
+    parser.add_argument('--counts', default='10,100', help="comma separated element counts")
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'case':<20}{'size':>11}{'n':>6}{'fps':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'calls':>7}{'call p50 us':>12}{'call p99 us':>12}{'retained':>10}{'churn KiB':>10}")
+    for case in args.cases.split(','):
+        for width, height in parse_sizes(args.sizes):
+            for n in [int(n) for n in args.counts.split(',')]:
+                r = run_case(case, width, height, n, args.frames)
+                results.append(r)
+                print(f"{case:<20}{f'{width}x{height}':>11}{n:>6}{r['fps']:>10.1f}{r['p50_ms']:>9.3f}{r['p90_ms']:>9.3f}{r['p99_ms']:>9.3f}{r['calls_per_frame']:>7.0f}{r['call_p50_us']:>12.1f}{r['call_p99_us']:>12.1f}{r['retained_blocks_per_frame']:>10.1f}{r['churn_kib_per_frame']:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'pygame': pygame.version.ver,
+                'numpy': numpy.__version__,
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
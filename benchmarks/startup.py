@@ -0,0 +1,99 @@
+"""Startup and per-box benchmark.
+
+Compares the import time of pygame_teleop with the import time of the
+SciPy modules it used to load, checks that importing the package does
+not initialize any SDL subsystem (or load SciPy), and times computing
+the corners of a rotated box with the NumPy/SciPy implementation it
+replaced. Exits with a non-zero status when a check fails or the import
+takes longer than --budget, so it can run in CI.
+
+    $ python benchmarks/startup.py --budget 0.5
+"""
+import sys
+import json
+import timeit
+import argparse
+import subprocess
+
+
+CODE = """
+import sys, json, time
+t0 = time.perf_counter()
+{statement}
+t = time.perf_counter() - t0
+import pygame
+print(json.dumps({{
+    'time': t,
+    'pygame.init': bool(pygame.get_init()),
+    'display': bool(pygame.display.get_init()),
+    'joystick': bool(pygame.joystick.get_init()),
+    'mixer': bool(pygame.mixer.get_init()),
+    'font': bool(pygame.font.get_init()),
+    'scipy': 'scipy' in sys.modules,
+}}))
+"""
+
+
+def import_time(statement, repeat=5):
+    """Best-of-repeat wall time in seconds of running statement in a fresh interpreter, and what the first run left initialized or loaded."""
+    results = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', CODE.format(statement=statement)], capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.splitlines()[-1]))
+    return min(r['time'] for r in results), results[0]
+
+
+def scipy_rectangle_points(width, height, center, rotation):
+    import numpy
+    from scipy.spatial.transform import Rotation
+    corners = 0.5*numpy.array([
+        [-1,  1, 1, -1],
+        [-1, -1, 1,  1],
+    ], dtype=float)
+    t = numpy.diag(center) @ numpy.ones(corners.shape, dtype=float)
+    R = Rotation.from_euler('z', rotation, degrees=True).as_matrix()[:2,:2]
+    S = numpy.diag([width, height])
+    return (t + R @ S @ corners).round().astype(int).T.tolist()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=None, help="maximum import time in seconds (best of repeat), not checked by default")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    number = 10000
+
+    # Import time
+    t_teleop, state = import_time('import pygame_teleop.screen, pygame_teleop.window, pygame_teleop.joystick', args.repeat)
+    budget = '' if args.budget is None else f" (budget {1e3*args.budget:.0f} ms)"
+    print(f"import pygame_teleop: {1e3*t_teleop:.1f} ms{budget}")
+    try:
+        t_scipy, _ = import_time('import scipy.spatial.transform, scipy.interpolate', args.repeat)
+        print(f"import scipy (previously loaded at startup): {1e3*t_scipy:.1f} ms")
+    except subprocess.CalledProcessError:
+        print("scipy is not installed, skipping comparison")
+        t_scipy = None
+
+    # Check nothing was initialized or loaded at import
+    failed = (args.budget is not None) and (t_teleop > args.budget)
+    for key in ('pygame.init', 'display', 'joystick', 'mixer', 'font', 'scipy'):
+        status = 'loaded' if key == 'scipy' else 'initialized'
+        if state[key]:
+            print(f"{key} was {status} at import")
+            failed = True
+
+    # Per-box cost
+    from pygame_teleop.viewer import _rectangle_points
+    t_box = timeit.timeit(lambda: _rectangle_points(100, 40, (250.0, 250.0), 33.0), number=number)/number
+    print(f"box corners: {1e6*t_box:.2f} us")
+    if t_scipy is not None:
+        t_box_scipy = timeit.timeit(lambda: scipy_rectangle_points(100, 40, (250.0, 250.0), 33.0), number=number)/number
+        print(f"box corners (scipy): {1e6*t_box_scipy:.2f} us, speedup {t_box_scipy/t_box:.1f}x")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -33,7 +33,6 @@ def main():
         }
     }
     screen = Screen(config)
-    clock = pygame.time.Clock()
     draw_colors = ['red', 'green', 'blue']
     draw_color = None
     hz = 80
@@ -64,8 +63,7 @@ def main():
                     screen.windows['robotenv'].convert_position(pos),
                     screen.windows['robotenv'].convert_scalar(0.02),
                 )
-            screen.final()
-            clock.tick(hz)
+            screen.final(hz)
     except KeyboardInterrupt:
         pass
 
@@ -1,7 +1,7 @@
 import numpy
 import pygame
 from pygame_teleop.screen import Screen
-from pygame_teleop.joystick import Joystick
+from pygame_teleop.joystick import Joystick, JoystickSampler
 
 
 def main():
@@ -50,13 +50,14 @@ def main():
     # Setup
     screen = Screen(config)
     joy = Joystick()
+    sampler = JoystickSampler(joy, hz=500)
+    sampler.start()
     running = True
     hz = 30
     dt = 1.0/float(hz)
     max_vel = 0.1
     x = numpy.array([0.5, 0.5*float(w2)/float(w1)], dtype=float)
     x_radius = 40
-    clock = pygame.time.Clock()
 
     # Main loop
     try:
@@ -67,10 +68,13 @@ def main():
                 if event.type == pygame.QUIT:
                     running = False
 
-            # Update user input
-            joy.reset()
-            axes = joy.get_axes()[:2]
-            if joy.get_button(0):
+            # Update user input, the sampler only sees new joystick
+            # state after the event queue is pumped above (at hz), a
+            # sample is published when the state changes and
+            # sample.time is when that change was seen
+            sample = sampler.sample
+            axes = sample.axes[:2]
+            if sample.buttons[0]:
                 running = False
 
             # Parse input
@@ -85,14 +89,12 @@ def main():
             screen.reset()
             screen.windows['joy'].draw(axes)
             screen.windows['robotenv'].robots['robot1'].draw(x)
-            screen.final()
-
-            # Tick
-            clock.tick(hz)
+            screen.final(hz)
 
     except KeyboardInterrupt:
         pass
 
+    sampler.stop()
     pygame.quit()
     print("Goodbye")
 
@@ -25,7 +25,6 @@ def main():
     x_radius = 40
     omega = -float(50)  # deg/sec
     r = 0.0
-    clock = pygame.time.Clock()
 
     # Main loop
     try:
@@ -45,10 +44,7 @@ def main():
             screen.reset()
             screen.rectangle('red', 100, 40, b, r)
             screen.circle('black', b, 10)
-            screen.final()
-
-            # Tick
-            clock.tick(hz)
+            screen.final(hz)
 
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,67 @@
+import time
+import numpy
+from math import cos, sin
+from pygame_teleop.scene import Scene, start_render_process
+
+
+# Setup config, could be easily loaded from a yaml file
+config = {
+    'caption': 'Render process example for pygame_teleop',
+    'width': 500,
+    'height': 500,
+    'background_color': 'darkslateblue',
+    'windows': {
+        'robotenv': {
+            'origin': (10, 10),
+            'width': 480,
+            'height': 480,
+            'background_color': 'white',
+            'type': 'RobotEnvironment',
+            'robotenv_width': 1.0,
+            'robotenv_height': 1.0,
+            'robotenv_origin_location': 'lower_left',
+            'robots': {
+                'robot1': {
+                    'robot_radius': 0.025,
+                    'show_path': False,
+                    'robot_color': 'blue',
+                },
+            }
+        }
+    }
+}
+
+
+def draw(screen, scene):
+    """Called by the render process once per frame with the latest scene snapshot."""
+    screen.windows['robotenv'].robots['robot1'].draw(scene['x'])
+
+
+def main():
+
+    # Setup, the control loop runs at 1 kHz here while the render
+    # process draws the latest published state at 60 Hz
+    scene = Scene({'x': (2,)})
+    process, stop_event = start_render_process(config, scene, draw, hz=60)
+    hz = 1000
+    dt = 1.0/float(hz)
+
+    # Control loop
+    try:
+        while not stop_event.is_set():
+            t = time.perf_counter()
+            x = 0.5*numpy.ones(2) + 0.2*numpy.array([cos(t), sin(t)])
+            scene.publish(x=x)
+            time.sleep(dt)
+    except KeyboardInterrupt:
+        pass
+
+    stop_event.set()
+    process.join()
+    scene.close()
+    scene.unlink()
+    print("Goodbye")
+
+
+if __name__ == '__main__':
+    main()
@@ -49,7 +49,6 @@ def main():
     x_radius = 40
     omega = numpy.deg2rad(190)
     r = 0.0
-    clock = pygame.time.Clock()
 
     # Main loop
     try:
@@ -71,10 +70,7 @@ def main():
             screen.windows['robotenv'].robots['robot1'].draw(x)
             screen.windows['robotenv'].draw_box('red', 0.2, 0.1, b, r)
             screen.windows['robotenv'].robots['box_center'].draw(b)
-            screen.final()
-
-            # Tick
-            clock.tick(hz)
+            screen.final(hz)
 
     except KeyboardInterrupt:
         pass
@@ -1,2 +0,0 @@
-import pygame
-pygame.init()
@@ -1,6 +1,67 @@
-import math
+import time
+import numpy
 import pygame
-pygame.joystick.init()
+import threading
+from collections import namedtuple
+
+
+JoystickSample = namedtuple('JoystickSample', ['time', 'axes', 'buttons'])
+
+
+# Axis shaping, the functions below operate on a pair of axes with
+# shape (2,) or on N pairs with shape (N, 2), e.g. a recorded log.
+
+
+def isometric_clamp(axes):
+    """Scales pairs of axes with a norm larger than one onto the unit circle."""
+    axes = numpy.asarray(axes, dtype=float)
+    norm = numpy.hypot(axes[..., 0], axes[..., 1])
+    return axes/numpy.maximum(norm, 1.0)[..., None]
+
+
+def radial_deadzone(axes, deadzone):
+    """Zeros pairs of axes with a norm below deadzone and rescales the rest so the output is continuous."""
+    axes = numpy.asarray(axes, dtype=float)
+    norm = numpy.hypot(axes[..., 0], axes[..., 1])
+    scale = numpy.maximum(norm - deadzone, 0.0)/((1.0 - deadzone)*numpy.maximum(norm, 1e-12))
+    return axes*scale[..., None]
+
+
+def axial_deadzone(axes, deadzone):
+    """Zeros each axis with a magnitude below deadzone and rescales the rest so the output is continuous."""
+    axes = numpy.asarray(axes, dtype=float)
+    return numpy.sign(axes)*numpy.maximum(numpy.abs(axes) - deadzone, 0.0)/(1.0 - deadzone)
+
+
+def expo_curve(axes, expo):
+    """Exponential response curve, expo=0 is linear and expo=1 is cubic."""
+    axes = numpy.asarray(axes, dtype=float)
+    return (1.0 - expo)*axes + expo*axes**3
+
+
+class AxisShaper:
+
+    """Shaping pipeline for pairs of axes: axial deadzone, radial deadzone, isometric clamp and expo curve."""
+
+
+    def __init__(self, axial_deadzone=0.0, radial_deadzone=0.0, isometric=True, expo=0.0):
+        self.axial_deadzone = axial_deadzone
+        self.radial_deadzone = radial_deadzone
+        self.isometric = isometric
+        self.expo = expo
+
+
+    def __call__(self, axes):
+        axes = numpy.asarray(axes, dtype=float)
+        if self.axial_deadzone > 0.0:
+            axes = axial_deadzone(axes, self.axial_deadzone)
+        if self.radial_deadzone > 0.0:
+            axes = radial_deadzone(axes, self.radial_deadzone)
+        if self.isometric:
+            axes = isometric_clamp(axes)
+        if self.expo > 0.0:
+            axes = expo_curve(axes, self.expo)
+        return axes
 
 
 class Joystick:
@@ -9,8 +70,11 @@ class Joystick:
 
 
     def __init__(self, jid=0):
+        if not pygame.joystick.get_init():
+            pygame.joystick.init()
         self.joy = pygame.joystick.Joystick(jid)
         self.joy_id = self.joy.get_id()
+        self.instance_id = self.joy.get_instance_id()  # identifies the joystick in events
         self.numaxes = self.joy.get_numaxes()
         self.numbuttons = self.joy.get_numbuttons()
         print("Initialized joystick:", self.joy.get_name())
@@ -18,11 +82,7 @@ class Joystick:
 
     @staticmethod
     def isometric(axes):
-        a0, a1 = axes
-        anorm = math.sqrt(a0**2 + a1**2)
-        ascale = min(1.0, anorm)
-        atheta = math.atan2(a1, a0)
-        return (ascale*math.cos(atheta), ascale*math.sin(atheta))
+        return tuple(isometric_clamp(axes).tolist())
 
 
     def reset(self):
@@ -47,14 +107,143 @@ class Joystick:
     def get_buttons_down(self, event_list):
         buttons = [False]*self.numbuttons
         for event in event_list:
-            if event.type == pygame.JOYBUTTONDOWN:
-                buttons[joy.button] = True
+            if event.type == pygame.JOYBUTTONDOWN and event.instance_id == self.instance_id:
+                buttons[event.button] = True
         return buttons
 
 
     def get_buttons_up(self, event_list):
         buttons = [False]*self.numbuttons
         for event in event_list:
-            if event.type == pygame.JOYBUTTONUP:
-                buttons[joy.button] = True
+            if event.type == pygame.JOYBUTTONUP and event.instance_id == self.instance_id:
+                buttons[event.button] = True
         return buttons
+
+
+class JoystickState:
+
+    """Joystick state maintained from the event list of each frame.
+
+    The state is read from the device once at construction, after that
+    update only processes the joystick events, so the per-frame cost is
+    proportional to the number of events. Axes and buttons are NumPy
+    arrays, down and up are the sets of buttons pressed and released
+    during the last update.
+    """
+
+
+    def __init__(self, joystick):
+        self.instance_id = joystick.instance_id
+        self.axes = numpy.array(joystick.get_axes(), dtype=float)
+        self.buttons = numpy.array(joystick.get_buttons(), dtype=bool)
+        self.down = set()
+        self.up = set()
+
+
+    def update(self, event_list):
+        """Consumes the events of a frame (i.e. from pygame.event.get)."""
+        down = set()
+        up = set()
+        for event in event_list:
+            event_type = event.type
+            if event_type == pygame.JOYAXISMOTION:
+                if event.instance_id == self.instance_id:
+                    self.axes[event.axis] = event.value
+            elif event_type == pygame.JOYBUTTONDOWN:
+                if event.instance_id == self.instance_id:
+                    self.buttons[event.button] = True
+                    down.add(event.button)
+            elif event_type == pygame.JOYBUTTONUP:
+                if event.instance_id == self.instance_id:
+                    self.buttons[event.button] = False
+                    up.add(event.button)
+        self.down = down
+        self.up = up
+
+
+class JoystickSampler:
+
+    """Samples a Joystick on a background thread at a fixed rate.
+
+    The latest state is published in the sample attribute as an
+    immutable JoystickSample (time, axes, buttons). Replacing the
+    reference is atomic, so the render loop and controllers can read it
+    at their own rates without locking. A new sample is only published
+    when the state changes (or while the filter is still settling), its
+    time is when the sampler first saw the change, so sample.time tells
+    how old the state is.
+
+    Note, SDL refreshes joystick state when events are pumped. In a
+    process with a window the main loop does this (pygame.event.get),
+    so changes are only seen at the rate of the main loop however fast
+    the sampler runs. In a process without one set pump_events=True so
+    the sampler thread pumps events itself.
+    """
+
+
+    def __init__(self, joystick, hz=500.0, filter_alpha=None, pump_events=False):
+        self.joystick = joystick
+        self.period = 1.0/float(hz)
+        self.filter_alpha = filter_alpha  # exponential smoothing factor for axes in (0, 1], None disables filtering
+        self.pump_events = pump_events
+        self.sample = None
+        self.last_poll = None  # time of the last poll, sample.time is older when the state did not change
+        self._raw = None  # unfiltered (axes, buttons) of the last poll
+        self._running = False
+        self._thread = None
+
+
+    def poll(self):
+        """Reads the joystick once, publishes a sample when the state changed and returns the latest sample."""
+
+        if self.pump_events:
+            pygame.event.pump()
+
+        raw = (tuple(self.joystick.get_axes()), tuple(self.joystick.get_buttons()))
+        self.last_poll = time.perf_counter()
+        previous = self.sample
+        if (previous is not None) and (raw == self._raw) and (previous.axes == raw[0]):
+            return previous  # nothing new (and the filter has settled), keep the time of the change
+        self._raw = raw
+        axes, buttons = raw
+
+        # Filter axes, snapped to the input once within 1e-6 so it settles
+        if (self.filter_alpha is not None) and (previous is not None):
+            a = self.filter_alpha
+            filtered = tuple(a*x + (1.0 - a)*x_prev for x, x_prev in zip(axes, previous.axes))
+            if any(abs(x_f - x) >= 1e-6 for x_f, x in zip(filtered, axes)):
+                axes = filtered
+
+        self.sample = JoystickSample(self.last_poll, axes, buttons)
+        return self.sample
+
+
+    def _run(self):
+        next_time = time.perf_counter()
+        while self._running:
+            self.poll()
+            next_time += self.period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.perf_counter()  # fell behind, don't try to catch up
+
+
+    def start(self):
+        """Starts sampling, the first sample is taken before returning."""
+        if self._running:
+            return
+        if self.pump_events and not pygame.display.get_init():
+            pygame.display.init()  # the event queue needs the video subsystem
+        self.poll()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='JoystickSampler', daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,82 @@
+"""
+Screen layouts.
+
+A layout is a screen config that has been validated and normalized
+once, it is frozen so it can be cached and shared between Screen
+instances (and pickled to a render process, see scene.py).
+"""
+from types import MappingProxyType
+from .window import get_window_type
+
+
+def _freeze(value):
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class Layout:
+
+    """Validated and frozen screen config, see compile_layout."""
+
+
+    def __init__(self, config, windows):
+        self.config = config  # frozen screen config
+        self.windows = windows  # tuple of (name, window class, frozen window config)
+
+
+    def __reduce__(self):
+        return compile_layout, (_thaw(self.config),)
+
+
+    def __repr__(self):
+        return f"Layout({', '.join(f'{name}={cls.__name__}' for name, cls, _ in self.windows)})"
+
+
+def _validate_screen(config):
+    missing = [key for key in ('width', 'height', 'background_color') if key not in config]
+    if missing:
+        raise ValueError(f"screen config is missing keys {missing}")
+    if config['width'] <= 0 or config['height'] <= 0:
+        raise ValueError("screen width and height must be positive")
+
+
+def _normalize_window(name, config, screen_config):
+    if 'type' not in config:
+        raise ValueError(f"window '{name}' is missing key 'type'")
+    if 'origin' not in config:
+        raise ValueError(f"window '{name}' is missing key 'origin'")
+    cls = get_window_type(config['type'])
+    config = dict(config)
+    config.setdefault('zorder', 0)
+    try:
+        cls.validate_config(config)
+    except ValueError as e:
+        raise ValueError(f"window '{name}' ({config['type']}): {e}") from None
+    x, y = config['origin']
+    if x >= screen_config['width'] or y >= screen_config['height'] or x + config['width'] <= 0 or y + config['height'] <= 0:
+        raise ValueError(f"window '{name}' lies outside the screen")
+    return cls, config
+
+
+def compile_layout(config):
+    """Validates and normalizes a screen config, returns a Layout. Raises ValueError when the config is not valid."""
+    if isinstance(config, Layout):
+        return config
+    _validate_screen(config)
+    classes = {}
+    normalized = {}
+    for name, window_config in config.get('windows', {}).items():
+        classes[name], normalized[name] = _normalize_window(name, window_config, config)
+    config = _freeze(dict(config, windows=normalized))
+    return Layout(config, tuple((name, classes[name], config['windows'][name]) for name in classes))
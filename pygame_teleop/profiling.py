@@ -0,0 +1,148 @@
+import time
+import numpy
+import pygame
+from collections import deque
+
+
+# Methods of windows (and the screen) that are timed when profiling is
+# enabled, methods a viewer doesn't have are skipped
+DRAWING_METHODS = (
+    'circle', 'static_circle',
+    'line', 'static_line',
+    'lines', 'static_lines',
+    'dashed_line', 'static_dashed_line',
+    'dashed_lines', 'static_dashed_lines',
+    'rectangle', 'static_rectangle',
+    'draw', 'draw_path', 'draw_box', 'draw_robots',
+    'plot_point', 'plot_line', 'plot_lines', 'plot_stream',
+)
+
+
+class FrameStats:
+
+    """Per-frame timing statistics, see the profile option of Screen.
+
+    Stage times (seconds) and window draw call counts and times are for
+    the last completed frame. Frame times (start of one frame to the
+    start of the next) are kept in a rolling history.
+    """
+
+    STAGES = ('reset', 'draw', 'composite', 'present', 'record', 'tick')
+
+
+    def __init__(self, history=600):
+        self.frame = 0
+        self.stages = dict.fromkeys(self.STAGES, 0.0)
+        self.window_calls = {}
+        self.window_times = {}
+        self.frame_times = deque(maxlen=history)
+        self.callbacks = []
+        self._window_calls = {}
+        self._window_times = {}
+        self._depth = 0  # nested drawing calls (e.g. draw_path calls lines) are only timed once
+        self._frame_start = None
+
+
+    def add_callback(self, callback):
+        """Registers callback(stats), called at the end of every frame."""
+        self.callbacks.append(callback)
+
+
+    def remove_callback(self, callback):
+        self.callbacks.remove(callback)
+
+
+    def instrument(self, name, viewer):
+        """Wraps the drawing methods of a viewer so calls are counted and timed under name."""
+        self._window_calls[name] = 0
+        self._window_times[name] = 0.0
+        for method_name in DRAWING_METHODS:
+            method = getattr(viewer, method_name, None)
+            if method is not None:
+                setattr(viewer, method_name, self._timed(name, method))
+
+
+    def _timed(self, name, method):
+        def timed(*args, **kwargs):
+            if self._depth:
+                return method(*args, **kwargs)
+            self._depth += 1
+            t0 = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._window_times[name] += time.perf_counter() - t0
+                self._window_calls[name] += 1
+                self._depth -= 1
+        return timed
+
+
+    def start_frame(self, t):
+        if self._frame_start is not None:
+            self.frame_times.append(t - self._frame_start)
+        self._frame_start = t
+
+
+    def end_frame(self):
+        self.window_calls = dict(self._window_calls)
+        self.window_times = dict(self._window_times)
+        for name in self._window_calls:
+            self._window_calls[name] = 0
+            self._window_times[name] = 0.0
+        self.frame += 1
+        for callback in self.callbacks:
+            callback(self)
+
+
+    def fps(self):
+        if not self.frame_times:
+            return 0.0
+        return len(self.frame_times)/sum(self.frame_times)
+
+
+    def percentile(self, q):
+        """Percentile (0-100) of the frame times in the history."""
+        return float(numpy.percentile(self.frame_times, q)) if self.frame_times else 0.0
+
+
+    def histogram(self, bins=20):
+        """Histogram of the frame times in the history, see numpy.histogram."""
+        return numpy.histogram(numpy.fromiter(self.frame_times, dtype=float), bins=bins)
+
+
+class StatsHUD:
+
+    """On-screen text overlay of FrameStats. The text is only re-rendered every interval frames."""
+
+
+    def __init__(self, stats, position=(5, 5), interval=15, font_size=16):
+        if not pygame.font.get_init():
+            pygame.font.init()
+        self.stats = stats
+        self.position = position
+        self.interval = interval
+        self.font = pygame.font.Font(None, font_size)
+        self.surface = None
+
+
+    def _render(self):
+        stats = self.stats
+        lines = [f"fps {stats.fps():.1f}  p99 {1e3*stats.percentile(99):.2f} ms"]
+        lines.append('  '.join(f"{stage} {1e3*t:.2f}" for stage, t in stats.stages.items()))
+        for name, t in stats.window_times.items():
+            lines.append(f"{name}: {stats.window_calls[name]} calls {1e3*t:.2f} ms")
+        surfaces = [self.font.render(line, True, 'white') for line in lines]
+        width = max(s.get_width() for s in surfaces) + 4
+        height = sum(s.get_height() for s in surfaces) + 4
+        self.surface = pygame.Surface((width, height))
+        y = 2
+        for s in surfaces:
+            self.surface.blit(s, (2, y))
+            y += s.get_height()
+
+
+    def draw(self, target):
+        """Blits the overlay on target, returns the rectangle drawn."""
+        if (self.surface is None) or (self.stats.frame % self.interval == 0):
+            self._render()
+        return target.blit(self.surface, self.position)
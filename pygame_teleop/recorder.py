@@ -0,0 +1,146 @@
+import sys
+import json
+import time
+import queue
+import numpy
+import pygame
+import threading
+
+
+class FrameRecorder:
+
+    """Records composited frames to disk on a writer thread.
+
+    Frames are copied into a pool of preallocated buffers on the render
+    thread and written by a background thread. When every buffer is in
+    use the frame is dropped and counted in frames_dropped, so recording
+    never stalls rendering.
+
+    Formats
+    'raw': frames are appended to filename as uint8 (height, width, 3)
+           arrays, load with numpy.memmap(filename, dtype='uint8',
+           mode='r').reshape(-1, height, width, 3).
+    'npz': frames are saved in chunks of chunk_size frames to
+           filename_00000.npz, filename_00001.npz, etc.
+
+    Timestamps and statistics are saved to filename.json on stop.
+    """
+
+
+    def __init__(self, filename, surface, pool_size=8, format='raw', chunk_size=64):
+        assert format in {'raw', 'npz'}, f"format '{format}' is not supported, use 'raw' or 'npz'"
+        self.filename = filename
+        self.format = format
+        self.chunk_size = chunk_size
+        self.width, self.height = surface.get_size()
+        self.frames_captured = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.timestamps = []
+
+        # 32-bit surfaces are copied with a single memcpy of the pixel
+        # memory, the channels are extracted on the writer thread
+        self._raw_copy = surface.get_bytesize() == 4
+        if self._raw_copy:
+            shape = (self.height, surface.get_pitch())
+            self._channels = [shift//8 for shift in surface.get_shifts()[:3]]  # byte of each channel, little-endian
+        else:
+            shape = (self.width, self.height, 3)
+        self._pool = [numpy.empty(shape, dtype=numpy.uint8) for _ in range(pool_size)]
+        self._free = queue.SimpleQueue()
+        for i in range(pool_size):
+            self._free.put(i)
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+        self._chunk = []
+        self._chunk_index = 0
+
+
+    def start(self):
+        if self.format == 'raw':
+            self._file = open(self.filename, 'wb')
+        self._thread = threading.Thread(target=self._run, name='FrameRecorder', daemon=True)
+        self._thread.start()
+
+
+    def record(self, surface):
+        """Copies the frame into a free buffer and queues it for writing, returns False when the frame is dropped."""
+
+        try:
+            i = self._free.get_nowait()
+        except queue.Empty:
+            self.frames_dropped += 1
+            return False
+
+        if self._raw_copy:
+            numpy.copyto(self._pool[i], numpy.frombuffer(surface.get_buffer(), dtype=numpy.uint8).reshape(self._pool[i].shape))
+        else:
+            pixels = pygame.surfarray.pixels3d(surface)
+            numpy.copyto(self._pool[i], pixels)
+            del pixels  # unlock surface
+
+        self._queue.put((i, time.perf_counter()))
+        self.frames_captured += 1
+        return True
+
+
+    def stop(self):
+        """Writes the remaining frames and the metadata, returns once everything is on disk."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._chunk:
+            self._write_chunk()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.filename + '.json', 'w') as f:
+            json.dump(dict(self.stats(), format=self.format, timestamps=self.timestamps), f)
+
+
+    def stats(self):
+        return {
+            'width': self.width,
+            'height': self.height,
+            'frames_captured': self.frames_captured,
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+        }
+
+
+    def _to_rgb(self, buffer):
+        """Converts a pool buffer to a (height, width, 3) RGB array."""
+        if not self._raw_copy:
+            return buffer.transpose(1, 0, 2)
+        if sys.byteorder == 'little':
+            channels = self._channels
+        else:
+            channels = [3 - c for c in self._channels]
+        return buffer.reshape(self.height, -1, 4)[:, :self.width, channels]
+
+
+    def _write_chunk(self):
+        numpy.savez(f'{self.filename}_{self._chunk_index:05d}.npz', frames=numpy.stack(self._chunk))
+        self._chunk_index += 1
+        self._chunk = []
+
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            i, t = item
+            frame = self._to_rgb(self._pool[i])
+            if self.format == 'raw':
+                self._file.write(numpy.ascontiguousarray(frame).data)
+            else:
+                self._chunk.append(numpy.ascontiguousarray(frame))  # frame can be a view of the buffer, which is reused once freed
+                if len(self._chunk) == self.chunk_size:
+                    self._write_chunk()
+            self._free.put(i)
+            self.timestamps.append(t)
+            self.frames_written += 1
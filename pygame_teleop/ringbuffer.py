@@ -0,0 +1,50 @@
+import numpy
+
+
+class RingBuffer:
+
+    """Fixed-capacity NumPy ring buffer.
+
+    The data is stored twice (mirrored) so the most recent items are
+    always available as a contiguous, ordered view without copying.
+    """
+
+
+    def __init__(self, capacity, shape=(), dtype=float):
+        assert capacity > 0, "capacity must be positive"
+        self.capacity = int(capacity)
+        self._data = numpy.zeros((2*self.capacity,) + tuple(shape), dtype=dtype)
+        self._head = 0  # index of the next write
+        self._count = 0
+
+
+    def __len__(self):
+        return self._count
+
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+
+    def append(self, values):
+        """Appends a batch of items, values has shape (m,)+shape. Only the last capacity items are kept."""
+        values = numpy.asarray(values, dtype=self._data.dtype)
+        m = values.shape[0]
+        if m == 0:
+            return
+        if m > self.capacity:
+            values = values[-self.capacity:]
+            m = self.capacity
+        idx = (self._head + numpy.arange(m)) % self.capacity
+        self._data[idx] = values
+        self._data[idx + self.capacity] = values
+        self._head = (self._head + m) % self.capacity
+        self._count = min(self._count + m, self.capacity)
+
+
+    def view(self, n=None):
+        """Returns the last n items (all by default), oldest first. This is a view, it is overwritten by later appends."""
+        n = self._count if n is None else min(n, self._count)
+        start = (self._head - n) % self.capacity
+        return self._data[start:start+n]
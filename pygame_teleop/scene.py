@@ -0,0 +1,152 @@
+import numpy
+import pygame
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+
+
+class Scene:
+
+    """Double-buffered scene snapshot in shared memory.
+
+    A scene is a fixed set of named float arrays (robot states, paths,
+    signals, etc), given as a dict mapping names to shapes. The control
+    loop publishes new values into the back buffer and flips it to the
+    front, the renderer copies the front buffer at its own rate. Each
+    buffer has a sequence number that is odd while it is written, so a
+    reader that overlaps a write retries instead of seeing a torn
+    snapshot, and neither side ever waits on the other for long.
+
+    Scenes can be passed to threads and to other processes (they are
+    re-attached by name). The process that created the scene should
+    call unlink when done.
+    """
+
+    # Header (int64): [front buffer, version, sequence of buffer 0, sequence of buffer 1]
+    _FRONT, _VERSION, _SEQ = 0, 1, 2
+
+
+    def __init__(self, fields, name=None, create=True):
+        self.fields = {key: tuple(shape) for key, shape in fields.items()}
+
+        # Layout
+        self._offsets = {}
+        size = 0
+        for key, shape in self.fields.items():
+            self._offsets[key] = size
+            size += int(numpy.prod(shape, dtype=int))
+        self._size = size
+
+        # Shared memory, header followed by the two buffers
+        nbytes = 8*(4 + 2*max(size, 1))
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=nbytes)
+        self._header = numpy.ndarray((4,), dtype=numpy.int64, buffer=self._shm.buf)
+        self._data = numpy.ndarray((2, max(size, 1)), dtype=numpy.float64, buffer=self._shm.buf, offset=8*4)
+        if create:
+            self._header[:] = 0
+            self._data[:] = 0.0
+
+
+    def __reduce__(self):
+        return (Scene, (self.fields, self.name, False))
+
+
+    @property
+    def name(self):
+        return self._shm.name
+
+
+    @property
+    def version(self):
+        """Number of publishes so far."""
+        return int(self._header[self._VERSION])
+
+
+    def publish(self, **values):
+        """Writes values (keyword arguments named as the fields) into the back buffer and flips it to the front. Fields not given keep their last published value."""
+
+        front = int(self._header[self._FRONT])
+        back = 1 - front
+        seq = self._SEQ + back
+
+        self._header[seq] += 1  # odd, writing
+        self._data[back] = self._data[front]
+        for key, value in values.items():
+            i = self._offsets[key]
+            self._data[back, i:i+int(numpy.prod(self.fields[key], dtype=int))] = numpy.ravel(value)
+        self._header[seq] += 1  # even, done
+
+        self._header[self._FRONT] = back
+        self._header[self._VERSION] += 1
+
+
+    def snapshot(self, retries=100):
+        """Returns a dict of copies of the front buffer and the version they belong to."""
+        for _ in range(retries):
+            version = int(self._header[self._VERSION])
+            front = int(self._header[self._FRONT])
+            seq = self._SEQ + front
+            s0 = int(self._header[seq])
+            if s0 % 2:
+                continue
+            data = self._data[front].copy()
+            if int(self._header[seq]) == s0:
+                break
+        else:
+            raise RuntimeError("failed to read a consistent scene snapshot")
+        snapshot = {key: data[i:i+int(numpy.prod(self.fields[key], dtype=int))].reshape(self.fields[key]) for key, i in self._offsets.items()}
+        return snapshot, version
+
+
+    def close(self):
+        self._header = None
+        self._data = None
+        self._shm.close()
+
+
+    def unlink(self):
+        self._shm.unlink()
+
+
+def render_loop(config, scene, draw, hz=60, stop_event=None):
+    """Renders a scene at the display rate until the window is closed or stop_event is set.
+
+    The screen is created inside the loop so it belongs to the thread or
+    process that runs it. draw(screen, snapshot) is called once per
+    frame between reset and final, snapshot is the dict returned by
+    Scene.snapshot.
+    """
+    from .screen import Screen
+    screen = Screen(config)
+    try:
+        while (stop_event is None) or (not stop_event.is_set()):
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            snapshot, _ = scene.snapshot()
+            screen.reset()
+            draw(screen, snapshot)
+            screen.final(hz)
+    finally:
+        if stop_event is not None:
+            stop_event.set()
+        pygame.display.quit()
+
+
+def start_render_thread(config, scene, draw, hz=60):
+    """Runs render_loop on a daemon thread, returns the thread and an event that stops it (and is set when the window is closed).
+
+    Note, some platforms (e.g. macOS) only allow windows on the main
+    thread, use start_render_process there or a headless screen.
+    """
+    stop_event = threading.Event()
+    thread = threading.Thread(target=render_loop, args=(config, scene, draw, hz, stop_event), name='render_loop', daemon=True)
+    thread.start()
+    return thread, stop_event
+
+
+def start_render_process(config, scene, draw, hz=60):
+    """Runs render_loop in another process, returns the process and an event that stops it (and is set when the window is closed). draw must be picklable, e.g. a module-level function."""
+    stop_event = multiprocessing.Event()
+    process = multiprocessing.Process(target=render_loop, args=(config, scene, draw, hz, stop_event), name='render_loop', daemon=True)
+    process.start()
+    return process, stop_event
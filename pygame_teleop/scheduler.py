@@ -0,0 +1,119 @@
+import time
+import numpy
+from collections import deque
+
+
+class FrameScheduler:
+
+    """Deadline-based frame pacing.
+
+    wait() sleeps for most of the remaining frame period and only spins
+    for the last spin seconds, so a core isn't pinned for the whole
+    frame. Deadlines are spaced by exactly one period (fractional rates
+    are supported), a frame that finishes after its deadline is counted
+    as missed and pacing restarts from the current time rather than
+    trying to catch up.
+    """
+
+
+    def __init__(self, hz, spin=0.001, history=600):
+        self.set_rate(hz)
+        self.spin = spin  # seconds
+        self.deadline = None
+        self.frames = 0
+        self.missed = 0
+        self.jitter = deque(maxlen=history)  # wake-up time minus deadline, seconds
+
+
+    def set_rate(self, hz):
+        """Sets the frame rate, hz <= 0 means no limit (like Clock.tick_busy_loop(0))."""
+        self.hz = float(hz)
+        self.period = 1.0/self.hz if self.hz > 0.0 else 0.0
+        self.deadline = None
+
+
+    def reset(self):
+        self.deadline = None
+
+
+    def wait(self):
+        """Blocks until the next deadline."""
+
+        now = time.perf_counter()
+        self.frames += 1
+
+        if self.period == 0.0:
+            return
+
+        if self.deadline is None:
+            self.deadline = now + self.period
+            return
+
+        remaining = self.deadline - now
+        if remaining < 0.0:
+            self.missed += 1
+            self.jitter.append(-remaining)
+            self.deadline = now + self.period
+            return
+
+        # Sleep, then spin for the final sub-millisecond
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while time.perf_counter() < self.deadline:
+            pass
+
+        self.jitter.append(time.perf_counter() - self.deadline)
+        self.deadline += self.period
+
+
+    def stats(self):
+        jitter = numpy.fromiter(self.jitter, dtype=float) if self.jitter else numpy.zeros(1)
+        return {
+            'hz': self.hz,
+            'frames': self.frames,
+            'missed': self.missed,
+            'jitter_mean': float(jitter.mean()),
+            'jitter_p99': float(numpy.percentile(jitter, 99)),
+            'jitter_max': float(jitter.max()),
+        }
+
+
+class FixedTimestep:
+
+    """Fixed-timestep accumulator that decouples simulation ticks from render ticks.
+
+    Call update() once per rendered frame and run the simulation step
+    the returned number of times. alpha is the fraction of a step left
+    in the accumulator, use it to interpolate between the last two
+    simulation states when drawing.
+    """
+
+
+    def __init__(self, dt, max_steps=10):
+        self.dt = float(dt)
+        self.max_steps = max_steps  # limits catch-up after a long stall
+        self.accumulator = 0.0
+        self.steps = 0
+        self._last = None
+
+
+    @property
+    def alpha(self):
+        return self.accumulator/self.dt
+
+
+    def update(self):
+        """Returns the number of simulation steps due since the last call."""
+        now = time.perf_counter()
+        if self._last is None:
+            self._last = now
+            return 0
+        self.accumulator += now - self._last
+        self._last = now
+        n = int(self.accumulator/self.dt)
+        self.accumulator -= n*self.dt
+        if n > self.max_steps:
+            n = self.max_steps
+            self.accumulator = 0.0
+        self.steps += n
+        return n
@@ -1,5 +1,12 @@
+import os
+import time
 import pygame
-from .viewer import Viewer
+from .viewer import Viewer, _merge_rects
+from .sprites import SpriteCache
+from .recorder import FrameRecorder
+from .profiling import FrameStats, StatsHUD
+from .scheduler import FrameScheduler
+from .layout import compile_layout
 
 
 class Screen(Viewer):
@@ -9,41 +16,210 @@ class Screen(Viewer):
 
     def __init__(self, config):
 
-        # Initialize base class
-        self.config = config
-        Viewer.__init__(self, config['width'], config['height'], config['background_color'])
+        # Initialize base class, config is either a dict or a Layout
+        # returned by compile_layout (which can be reused across screens)
+        self.layout = compile_layout(config)
+        self.config = config = self.layout.config
+        Viewer.__init__(self, config['width'], config['height'], config['background_color'], config.get('incremental_reset', False))
+        if config.get('sprite_cache', False):
+            self.sprite_cache = SpriteCache(config.get('sprite_cache_bytes', 8*1024*1024), config.get('sprite_cache_rotation_step', 1.0))
 
-        # Setup screen
-        self.screen = pygame.display.set_mode(self.static_surface.get_size())
-        pygame.display.set_caption(self.config.get('caption', 'pygame_teleop'))
-        self.clock = pygame.time.Clock()
+        # Setup screen, in headless mode frames are composited into an
+        # offscreen surface and never presented. The SDL dummy video
+        # driver is used so the event queue works without a display.
+        # Only the video subsystem is initialized (pygame.init is never
+        # called), see also Joystick.
+        self.headless = self.config.get('headless', False)
+        self.throttle = self.config.get('throttle', not self.headless)  # when False, final ignores hz
+        if self.headless:
+            if not pygame.display.get_init():
+                os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+                pygame.display.init()
+            self.screen = pygame.Surface(self.static_surface.get_size())
+        else:
+            if not pygame.display.get_init():
+                pygame.display.init()
+            self.screen = pygame.display.set_mode(self.static_surface.get_size())
+            pygame.display.set_caption(self.config.get('caption', 'pygame_teleop'))
+        self.clock = pygame.time.Clock()  # ticked (without limit) by final, e.g. for clock.get_fps()
+        self.scheduler = None  # created on the first call to final with hz, see FrameScheduler
 
         self._init_windows()
 
+        # Windows without their own sprite cache share the screen's
+        if self.sprite_cache is not None:
+            for window in self.windows.values():
+                if window.sprite_cache is None:
+                    window.sprite_cache = self.sprite_cache
+
+        # Setup compositing, when dirty_rects is enabled only the
+        # regions touched by drawing functions are re-composited and
+        # presented to the display
+        self.dirty_rects_enabled = self.config.get('dirty_rects', False)
+        self.screen_pixels = self.screen.get_width()*self.screen.get_height()
+        self.pixels_saved = 0  # number of pixels not presented in the last call to final
+        self._previous_update_rects = None
+
+        self.recorder = None  # see start_recording
+
+        # Setup profiling, when disabled stats is None and the drawing
+        # methods are not wrapped so there is no overhead
+        self.stats = None
+        self.hud = None
+        if self.config.get('profile', False):
+            self.stats = FrameStats(self.config.get('profile_history', 600))
+            self.stats.instrument('screen', self)
+            for name, window in self.windows.items():
+                self.stats.instrument(name, window)
+            if self.config.get('profile_hud', False):
+                self.hud = StatsHUD(self.stats)
+        self._t_reset = 0.0
+
 
     def _init_windows(self):
-        from .window import RobotEnvironment, Joystick, TimeSeries
-        # Note, "from .window import *" throws syntax error. Will have
-        # to update this when ever I add a new class in the window.py
-        # script.
         self.windows = {}
-        for name, config in self.config.get('windows', {}).items():
-            class_type = config['type']
-            self.windows[name] = eval(f'{class_type}(config)')
+        for name, cls, config in self.layout.windows:
+            self.windows[name] = cls(config)
             print("Initialized window:", name)
+        self.windows_zorder = sorted(self.windows.values(), key=lambda x: x.z_order)
 
 
     def reset(self):
+        if self.stats is not None:
+            t0 = time.perf_counter()
+            self.stats.start_frame(t0)
         Viewer.reset(self)
         for window in self.windows.values():
             window.reset()
+        if self.stats is not None:
+            self._t_reset = time.perf_counter()
+            self.stats.stages['reset'] = self._t_reset - t0
 
 
-    def final(self, hz=None):
+    def _get_dirty_rects(self):
+        """Returns the rectangles, in screen coordinates, touched since the last reset."""
+        rects = list(self.dirty_rects)
+        for window in self.windows_zorder:
+            x, y = window.config['origin']
+            rects += [rect.move(x, y) for rect in window.dirty_rects]
+        return _merge_rects(rects)
+
+
+    def _composite(self, rect):
+        self.screen.blit(self.surface, rect, rect)
+        for window in self.windows_zorder:
+            x, y = window.config['origin']
+            area = rect.move(-x, -y).clip(window.surface.get_rect())
+            if area:
+                self.screen.blit(window.surface, (area.x + x, area.y + y), area)
+
+
+    def _composite_full(self):
         self.screen.blit(self.surface, (0, 0))
-        windows = sorted(self.windows.values(), key=lambda x: x.z_order)
-        for window in windows:
+        for window in self.windows_zorder:
             self.screen.blit(window.surface, window.config['origin'])
-        pygame.display.flip()
-        if isinstance(hz, int):
-            self.clock.tick_busy_loop(hz)
+        self.pixels_saved = 0
+        if self.dirty_rects_enabled:
+            self._previous_update_rects = self._get_dirty_rects()
+
+
+    def _composite_dirty(self):
+        """Re-composites the dirty regions and returns the rectangles to update."""
+
+        # Anything drawn in the previous frame must be erased, so
+        # those rectangles are updated again this frame
+        rects = self._get_dirty_rects()
+        update_rects = _merge_rects(self._previous_update_rects + rects)
+        self._previous_update_rects = rects
+
+        for rect in update_rects:
+            self._composite(rect)
+        self.pixels_saved = self.screen_pixels - sum(rect.w*rect.h for rect in update_rects)
+
+        return update_rects
+
+
+    def final(self, hz=None):
+
+        stats = self.stats
+        if stats is not None:
+            t0 = time.perf_counter()
+            stats.stages['draw'] = t0 - self._t_reset
+
+        # Composite
+        self.flush()
+        for window in self.windows_zorder:
+            window.flush()
+        if self.dirty_rects_enabled and self._previous_update_rects is not None:
+            update_rects = self._composite_dirty()
+        else:
+            self._composite_full()
+            update_rects = None
+
+        if stats is not None:
+            t1 = time.perf_counter()
+            stats.stages['composite'] = t1 - t0
+            if self.hud is not None:
+                hud_rect = self.hud.draw(self.screen)
+                if update_rects is not None:
+                    update_rects.append(hud_rect)
+                    self._previous_update_rects.append(hud_rect)  # erased next frame
+
+        # Present
+        if not self.headless:
+            if update_rects is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(update_rects)
+
+        if stats is not None:
+            t2 = time.perf_counter()
+            stats.stages['present'] = t2 - t1
+
+        # Record
+        if self.recorder is not None:
+            self.recorder.record(self.screen)
+
+        if stats is not None:
+            t3 = time.perf_counter()
+            stats.stages['record'] = t3 - t2
+
+        # Tick, pacing is done by the scheduler (hz <= 0 means no limit)
+        self.clock.tick()
+        if (hz is not None) and self.throttle:
+            if self.scheduler is None:
+                self.scheduler = FrameScheduler(hz, self.config.get('spin', 0.001))
+            elif hz != self.scheduler.hz:
+                self.scheduler.set_rate(hz)
+            self.scheduler.wait()
+
+        if stats is not None:
+            stats.stages['tick'] = time.perf_counter() - t3
+            stats.end_frame()
+
+
+    def start_recording(self, filename, **kwargs):
+        """Records every composited frame to disk, keyword arguments are passed to FrameRecorder."""
+        self.stop_recording()
+        self.recorder = FrameRecorder(filename, self.screen, **kwargs)
+        self.recorder.start()
+
+
+    def stop_recording(self):
+        """Stops recording and returns the recorder statistics (None when not recording)."""
+        if self.recorder is None:
+            return None
+        recorder = self.recorder
+        self.recorder = None
+        recorder.stop()
+        return recorder.stats()
+
+
+    def get_frame_buffer(self):
+        """Zero-copy view (pygame.BufferProxy) of the last composited frame, indexed as [x, y, rgb]."""
+        return self.screen.get_view('3')
+
+
+    def get_frame_array(self):
+        """Zero-copy NumPy array of the last composited frame, indexed as [x, y, rgb]. Note, the screen is locked while the array exists."""
+        return pygame.surfarray.pixels3d(self.screen)
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+
+class SpriteCache:
+
+    """Least-recently-used cache of pre-rasterized primitives with a byte budget.
+
+    Sprites are stored as (surface, offset) pairs, the sprite is drawn
+    by blitting surface at the primitive's position plus offset. Keys
+    are built by the drawing functions in viewer.py from the shape,
+    size, color, alpha and quantized rotation.
+    """
+
+
+    def __init__(self, max_bytes=8*1024*1024, rotation_step=1.0):
+        self.max_bytes = max_bytes
+        self.rotation_step = rotation_step  # degrees
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sprites = OrderedDict()
+
+
+    def __len__(self):
+        return len(self._sprites)
+
+
+    def quantize_rotation(self, rotation):
+        return (round(float(rotation)/self.rotation_step)*self.rotation_step) % 360.0
+
+
+    def get(self, key, render, *args):
+        """Returns the sprite for key, calling render(*args) to rasterize it on a miss."""
+
+        # Check cache
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        # Rasterize and insert
+        self.misses += 1
+        sprite = render(*args)
+        self._sprites[key] = sprite
+        self.nbytes += _sprite_nbytes(sprite)
+
+        # Evict least recently used sprites, the newest is always kept
+        while self.nbytes > self.max_bytes and len(self._sprites) > 1:
+            _, old_sprite = self._sprites.popitem(last=False)
+            self.nbytes -= _sprite_nbytes(old_sprite)
+            self.evictions += 1
+
+        return sprite
+
+
+    def clear(self):
+        self._sprites.clear()
+        self.nbytes = 0
+
+
+    def stats(self):
+        return {
+            'size': len(self._sprites),
+            'nbytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def _sprite_nbytes(sprite):
+    surface, _ = sprite
+    return surface.get_pitch()*surface.get_height()
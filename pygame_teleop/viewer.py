@@ -1,172 +1,358 @@
 import pygame
 import math
 import numpy
-from scipy.spatial.transform import Rotation
-
-"""
-TODO:
-- Give all drawing functions an alpha value, see https://stackoverflow.com/a/64630102
-- Once above is done, check window.py has alpha features too
-"""
-
-
-def _draw_dashed_line(surf, color, start_pos, end_pos, width=1, dash_length=10):
-    """Helper function for drawing dashed lines. Thanks to https://codereview.stackexchange.com/a/70206"""
-
-
-    class Point:
-        # constructed using a normal tupple
-        def __init__(self, point_t = (0,0)):
-            self.x = float(point_t[0])
-            self.y = float(point_t[1])
-        # define all useful operators
-        def __add__(self, other):
-            return Point((self.x + other.x, self.y + other.y))
-        def __sub__(self, other):
-            return Point((self.x - other.x, self.y - other.y))
-        def __mul__(self, scalar):
-            return Point((self.x*scalar, self.y*scalar))
-        def __div__(self, scalar):
-            return Point((self.x/scalar, self.y/scalar))
-        def __len__(self):
-            return int(math.sqrt(self.x**2 + self.y**2))
-        # get back values in original tuple format
-        def get(self):
-            return (self.x, self.y)
-
-
-    origin = Point(start_pos)
-    target = Point(end_pos)
-    displacement = target - origin
-    length = len(displacement)
-    slope = displacement/length
-
-    for index in range(0, length/dash_length, 2):
-        start = origin + (slope *    index    * dash_length)
-        end   = origin + (slope * (index + 1) * dash_length)
-        pygame.draw.line(surf, color, start.get(), end.get(), width)
-
-
-def _draw_dashed_lines(surf, color, points, width=1, dash_length=8):
-    """Helper function for drawing dashed lines. Thanks to https://stackoverflow.com/a/66944050"""
-
-    def draw_dashed_line(surf, color, p1, p2, prev_line_len, dash_length):
-        dx, dy = p2[0]-p1[0], p2[1]-p1[1]
-        if dx == 0 and dy == 0:
-            return
-        dist = math.hypot(dx, dy)
-        dx /= dist
-        dy /= dist
-
-        step = dash_length*2
-        start = (int(prev_line_len) // step) * step
-        end = (int(prev_line_len + dist) // step + 1) * step
-        for i in range(start, end, dash_length*2):
-            s = max(0, start - prev_line_len)
-            e = min(start - prev_line_len + dash_length, dist)
-            if s < e:
-                ps = p1[0] + dx * s, p1[1] + dy * s
-                pe = p1[0] + dx * e, p1[1] + dy * e
-                pygame.draw.line(surf, color, pe, ps, width)
-
-    line_len = 0
-    for i in range(1, len(points)):
-        p1, p2 = points[i-1], points[i]
-        dist = math.hypot(p2[0]-p1[0], p2[1]-p1[1])
-        draw_dashed_line(surf, color, p1, p2, line_len, dash_length)
-        line_len += dist
+import functools
+
+
+def _dash_segments(points, dash_length):
+    """Start and end points of the dashes along a polyline, as an (m, 4) array of [xs, ys, xe, ye].
+
+    Dashes follow the cumulative arc length of the whole polyline, so
+    the pattern continues across vertices, and a dash that spans a
+    vertex is split there so it doesn't cut the corner.
+    """
+
+    P = numpy.asarray(points, dtype=float).reshape(-1, 2)
+    if P.shape[0] < 2:
+        return numpy.zeros((0, 4))
+
+    # Arc length at each vertex
+    s = numpy.concatenate(([0.0], numpy.cumsum(numpy.hypot(*numpy.diff(P, axis=0).T))))
+    total = s[-1]
+    if total <= 0.0:
+        return numpy.zeros((0, 4))
+
+    # Break points: dash boundaries and vertices, pieces whose midpoint
+    # is in an "on" interval of the pattern are drawn
+    boundaries = numpy.arange(0.0, total, dash_length)
+    b = numpy.unique(numpy.concatenate((boundaries, s, [total])))
+    u, v = b[:-1], b[1:]
+    on = (numpy.floor(0.5*(u + v)/dash_length) % 2) == 0
+    u, v = u[on], v[on]
+
+    # Interpolate positions, zero-length edges are removed so the arc
+    # length is strictly increasing
+    keep = numpy.concatenate(([True], numpy.diff(s) > 0))
+    s, P = s[keep], P[keep]
+    return numpy.stack((
+        numpy.interp(u, s, P[:, 0]),
+        numpy.interp(u, s, P[:, 1]),
+        numpy.interp(v, s, P[:, 0]),
+        numpy.interp(v, s, P[:, 1]),
+    ), axis=1)
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_dash_segments(points_bytes, dash_length):
+    """Dash pattern of a polyline given as the bytes of an (n, 2) float array, repeated (e.g. static) paths are a lookup."""
+    points = numpy.frombuffer(points_bytes, dtype=float).reshape(-1, 2)
+    return _dash_segments(points, dash_length).tolist()
+
+
+def _draw_dashed_lines(surf, color, points, width=1, dash_length=10, cache=False):
+    """Draws a dashed polyline, returns the bounding rectangle. Use cache only for paths that repeat (e.g. static drawing)."""
+    if cache:
+        segments = _cached_dash_segments(numpy.asarray(points, dtype=float).tobytes(), float(dash_length))
+    else:
+        segments = _dash_segments(points, dash_length).tolist()
+    line = pygame.draw.line
+    rects = [line(surf, color, (xs, ys), (xe, ye), width) for xs, ys, xe, ye in segments]
+    return _union_rects(rects)
+
+
+def _draw_dashed_line(surf, color, start_pos, end_pos, width=1, dash_length=10, cache=False):
+    return _draw_dashed_lines(surf, color, [start_pos, end_pos], width, dash_length, cache)
+
+
+def _union_rects(rects):
+    """Bounding rectangle of a list of rectangles, an empty rectangle is returned when the list is empty."""
+    if not rects:
+        return pygame.Rect(0, 0, 0, 0)
+    return rects[0].unionall(rects[1:])
+
+
+_RECTANGLE_CORNERS = ((-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5))
+
+
+@functools.lru_cache(maxsize=4096)
+def _cos_sin(rotation):
+    """Cached cosine and sine of a rotation in degrees, repeated rotations (e.g. from a SpriteCache) are a lookup."""
+    r = math.radians(rotation)
+    return math.cos(r), math.sin(r)
+
+
+def _color(color, alpha):
+    c = pygame.Color(color)
+    c.a = alpha
+    return c
+
+
+def _points_rect(points, pad):
+    """Bounds of points padded by pad pixels (e.g. a line width or a radius), rounded outwards."""
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    x0, y0 = math.floor(min(xs)) - pad, math.floor(min(ys)) - pad
+    return pygame.Rect(x0, y0, math.ceil(max(xs)) + pad + 1 - x0, math.ceil(max(ys)) + pad + 1 - y0)
 
 
+def _merge_rects(rects):
+    """Merges overlapping rectangles so no pixel is blitted twice."""
+    merged = []
+    for rect in rects:
+        if not rect:
+            continue
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect = rect.union(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+def _rectangle_points(width, height, center, rotation):
+    """Corners of a rectangle rotated (in degrees) about its center."""
+    c, s = _cos_sin(float(rotation))
+    tx, ty = float(center[0]), float(center[1])
+    points = []
+    for a, b in _RECTANGLE_CORNERS:
+        x, y = a*width, b*height
+        points.append([int(round(tx + c*x - s*y)), int(round(ty + s*x + c*y))])
+    return points
+
+
+def _render_polygon(color, points):
+    """Draws a polygon on a temporary surface, returns the surface and the position to blit it at."""
+    lx, ly = zip(*points)
+    min_x, min_y, max_x, max_y = min(lx), min(ly), max(lx), max(ly)
+    shape_surf = pygame.Surface((max_x - min_x, max_y - min_y), pygame.SRCALPHA)
+    pygame.draw.polygon(shape_surf, color, [(x - min_x, y - min_y) for x, y in points])
+    return shape_surf, (min_x, min_y)
+
+
+def _render_rectangle(color, width, height, rotation):
+    return _render_polygon(color, _rectangle_points(width, height, (0, 0), rotation))
+
+
+def _render_circle(color, radius):
+    size = 2*radius + 2
+    shape_surf = pygame.Surface((size, size), pygame.SRCALPHA)
+    rect = pygame.draw.circle(shape_surf, color, (radius + 1, radius + 1), radius)
+    return shape_surf.subsurface(rect).copy(), (rect.x - radius - 1, rect.y - radius - 1)
+
 
 class Viewer:
 
     """This is a base-class for viewers in pygame."""
 
 
-    def __init__(self, width, height, background_color):
+    def __init__(self, width, height, background_color, incremental_reset=False, sprite_cache=None):
         self.background_color = pygame.Color(background_color)
+        self.sprite_cache = sprite_cache  # when given, circles and rectangles are blitted from a SpriteCache
         self.surface = None
         self.static_surface = pygame.Surface((width, height))
         self.static_surface.fill(self.background_color)
+        self.dirty_rects = []  # rectangles touched by drawing functions since the last reset
+        self._static_dirty_rects = []
+
+        # When incremental_reset is True, surface is kept between
+        # frames and reset only restores the dirty rectangles from
+        # static_surface. Note, anything drawn directly onto surface
+        # (i.e. not using the drawing functions below) is not tracked.
+        self.incremental_reset = incremental_reset
+        self._static_changed = True
+        self._background = None  # when set, reset restores from this surface (static_surface plus baked layers) instead
+
+        # See flush
+        self._overlay = None
+        self._static_overlay = None
+        self._overlay_rects = []
 
 
     def reset(self):
-        self.surface = self.static_surface.copy()
+        background = self.static_surface if self._background is None else self._background
+        if not self.incremental_reset:
+            self.surface = background.copy()
+        elif self.surface is None:
+            self.surface = background.copy()
+        elif self._static_changed:
+            self.surface.blit(background, (0, 0))
+        else:
+            for rect in self.dirty_rects:
+                self.surface.blit(background, rect, rect)
+        self._static_changed = False
+
+        # Discard translucent drawing that was never flushed
+        if self._overlay_rects:
+            for rect in self._overlay_rects:
+                self._overlay.fill((0, 0, 0, 0), rect)
+            self._overlay_rects = []
+
+        # Static drawing only shows up on surface after the copy
+        # above, so those rectangles stay dirty for this frame too
+        self.dirty_rects = self._static_dirty_rects
+        self._static_dirty_rects = []
+
+
+    def _mark_dirty(self, rect):
+        if rect:
+            self.dirty_rects.append(rect)
+
+
+    def _mark_background_dirty(self, rect):
+        """Tracks a change to _background, restored on the next reset like static drawing but without a full restore."""
+        if rect:
+            self.dirty_rects.append(rect)
+            self._static_dirty_rects.append(rect)
+
+
+    def _mark_static_dirty(self, rect):
+        if rect:
+            self.dirty_rects.append(rect)
+            self._static_dirty_rects.append(rect)
+            self._static_changed = True
+
+
+    # Translucent drawing, primitives with alpha < 255 are drawn on a
+    # pooled SRCALPHA overlay (one per viewer, allocated on first use)
+    # and blended onto surface once per frame by flush. Pending regions
+    # of the overlay that an opaque primitive is about to cover are
+    # blended first, so the drawing order is kept. Note, overlapping
+    # translucent primitives don't blend with each other.
+
+
+    def _get_overlay(self, static):
+        if static:
+            if self._static_overlay is None:
+                self._static_overlay = pygame.Surface(self.static_surface.get_size(), pygame.SRCALPHA)
+            return self._static_overlay
+        if self._overlay is None:
+            self._overlay = pygame.Surface(self.static_surface.get_size(), pygame.SRCALPHA)
+        return self._overlay
+
+
+    def _begin(self, static, alpha, points=None, pad=0):
+        """Returns the surface to draw a primitive on, points and pad bound the primitive (see _points_rect, None means anywhere)."""
+        if alpha >= 255:
+            if static:
+                return self.static_surface
+            if self._overlay_rects:
+                self._flush_under(None if points is None else _points_rect(points, pad))
+            return self.surface
+        return self._get_overlay(static)
+
+
+    def _end(self, static, alpha, rect):
+        """Tracks the rectangle touched by a primitive drawn on the surface returned by _begin."""
+        if alpha < 255 and rect:
+            if static:
+                self.static_surface.blit(self._static_overlay, rect, rect)
+                self._static_overlay.fill((0, 0, 0, 0), rect)
+            else:
+                self._overlay_rects.append(rect)
+        if static:
+            self._mark_static_dirty(rect)
+        else:
+            self._mark_dirty(rect)
+
+
+    def _flush_under(self, rect):
+        """Blends the pending translucent primitives that collide with rect (all when rect is None) onto surface."""
+        if rect is None:
+            self.flush()
+            return
+        for i in reversed(rect.collidelistall(self._overlay_rects)):
+            r = self._overlay_rects.pop(i)
+            self.surface.blit(self._overlay, r, r)
+            self._overlay.fill((0, 0, 0, 0), r)
+
+
+    def flush(self):
+        """Blends the translucent primitives drawn since the last flush onto surface, Screen.final calls this before compositing."""
+        if not self._overlay_rects:
+            return
+        for rect in _merge_rects(self._overlay_rects):
+            self.surface.blit(self._overlay, rect, rect)
+            self._overlay.fill((0, 0, 0, 0), rect)
+        self._overlay_rects = []
 
 
     # Drawing
 
 
-    def static_circle(self, color, center, radius):
-        pygame.draw.circle(self.static_surface, pygame.Color(color), center, radius)
+    def _circle(self, surface, color, center, radius):
+
+        if self.sprite_cache is None:
+            return pygame.draw.circle(surface, color, center, radius)
+
+        # Blit pre-rasterized circle
+        key = ('circle', int(radius), tuple(color))
+        sprite_surf, (dx, dy) = self.sprite_cache.get(key, _render_circle, color, int(radius))
+        return surface.blit(sprite_surf, (int(round(center[0])) + dx, int(round(center[1])) + dy))
 
 
-    def circle(self, color, center, radius):
-        pygame.draw.circle(self.surface, pygame.Color(color), center, radius)
+    def static_circle(self, color, center, radius, alpha=255):
+        a = alpha if self.sprite_cache is None else 255  # sprites are blended when blitted
+        self._end(True, a, self._circle(self._begin(True, a), _color(color, alpha), center, radius))
 
 
-    def static_line(self, color, start_pos, end_pos, width=1):
-        pygame.draw.line(self.static_surface, pygame.Color(color), start_pos, end_pos, width=width)
+    def circle(self, color, center, radius, alpha=255):
+        a = alpha if self.sprite_cache is None else 255
+        self._end(False, a, self._circle(self._begin(False, a, (center,), radius), _color(color, alpha), center, radius))
 
 
-    def line(self, color, start_pos, end_pos, width=1):
-        pygame.draw.line(self.surface, pygame.Color(color), start_pos, end_pos, width=width)
+    def static_line(self, color, start_pos, end_pos, width=1, alpha=255):
+        self._end(True, alpha, pygame.draw.line(self._begin(True, alpha), _color(color, alpha), start_pos, end_pos, width=width))
 
 
-    def static_lines(self, color, points, width=1):
+    def line(self, color, start_pos, end_pos, width=1, alpha=255):
+        self._end(False, alpha, pygame.draw.line(self._begin(False, alpha, (start_pos, end_pos), width), _color(color, alpha), start_pos, end_pos, width=width))
+
+
+    def static_lines(self, color, points, width=1, alpha=255):
         closed = False  # in teleop, rarely want lines filled in
-        pygame.draw.lines(self.static_surface, pygame.Color(color), closed, points, width=width)
+        self._end(True, alpha, pygame.draw.lines(self._begin(True, alpha), _color(color, alpha), closed, points, width=width))
 
 
-    def lines(self, color, points, width=1):
+    def lines(self, color, points, width=1, alpha=255):
         closed = False  # in teleop, rarely want lines filled in
-        pygame.draw.lines(self.surface, pygame.Color(color), closed, points, width=width)
+        self._end(False, alpha, pygame.draw.lines(self._begin(False, alpha, points, width), _color(color, alpha), closed, points, width=width))
+
 
+    def static_dashed_line(self, color, start_pos, end_pos, width=1, dash_length=10, alpha=255):
+        self._end(True, alpha, _draw_dashed_line(self._begin(True, alpha), _color(color, alpha), start_pos, end_pos, width, dash_length, cache=True))
 
-    def static_dashed_line(self, color, start_pos, end_pos, width=1, dashed_length=10):
-        _draw_dashed_line(self.static_surface, color, start_pos, end_pos, width, dash_length)
 
+    def dashed_line(self, color, start_pos, end_pos, width=1, dash_length=10, alpha=255):
+        self._end(False, alpha, _draw_dashed_line(self._begin(False, alpha, (start_pos, end_pos), width), _color(color, alpha), start_pos, end_pos, width, dash_length))
 
-    def dashed_line(self, color, start_pos, end_pos, width=1, dashed_length=10):
-        _draw_dashed_line(self.surface, color, start_pos, end_pos, width, dash_length)
 
+    def static_dashed_lines(self, color, points, width=1, dash_length=10, alpha=255):
+        self._end(True, alpha, _draw_dashed_lines(self._begin(True, alpha), _color(color, alpha), points, width, dash_length, cache=True))
 
-    def static_dashed_lines(self, color, points, width=1, dash_length=10):
-        _draw_dashed_lines(self.static_surface, color, points, width, dash_length)
 
+    def dashed_lines(self, color, points, width=1, dash_length=10, alpha=255):
+        self._end(False, alpha, _draw_dashed_lines(self._begin(False, alpha, points, width), _color(color, alpha), points, width, dash_length))
 
-    def dashed_lines(self, color, points, width=1, dash_length=10):
-        _draw_dashed_lines(self.surface, color, points, width, dash_length)
 
-    def _rectangle(self, surface, color, width, height, top_left_corner_pos, rotation=0, alpha=255):
+    def _rectangle(self, static, color, width, height, top_left_corner_pos, rotation=0, alpha=255):
 
         # Setup color
-        c = pygame.Color(color)
-        c.a = alpha
-
-        # Generate points of rectangle
-        corners = 0.5*numpy.array([
-            [-1,  1, 1, -1],
-            [-1, -1, 1,  1],
-        ], dtype=float)
-        t = numpy.diag(top_left_corner_pos) @ numpy.ones(corners.shape, dtype=float)
-        R = Rotation.from_euler('z', rotation, degrees=True).as_matrix()[:2,:2]
-        S = numpy.diag([width, height])
-        points = (t + R @ S @ corners).round().astype(int).T.tolist()
-
-        # Draw on temp surface
-        lx, ly = zip(*points)
-        min_x, min_y, max_x, max_y = min(lx), min(ly), max(lx), max(ly)
-        target_rect = pygame.Rect(min_x, min_y, max_x - min_x, max_y - min_y)
-        shape_surf = pygame.Surface(target_rect.size, pygame.SRCALPHA)
-        pygame.draw.polygon(shape_surf, c, [(x - min_x, y - min_y) for x, y in points])
-
-        # Draw on surface
-        surface.blit(shape_surf, target_rect)
+        c = _color(color, alpha)
+
+        if self.sprite_cache is None:
+            points = _rectangle_points(width, height, top_left_corner_pos, rotation)
+            self._end(static, alpha, pygame.draw.polygon(self._begin(static, alpha, points), c, points))
+        else:
+            rotation = self.sprite_cache.quantize_rotation(rotation)
+            key = ('rectangle', width, height, tuple(c), rotation)
+            shape_surf, (dx, dy) = self.sprite_cache.get(key, _render_rectangle, c, width, height, rotation)
+            offset = (int(round(top_left_corner_pos[0])) + dx, int(round(top_left_corner_pos[1])) + dy)
+            self._end(static, 255, self._begin(static, 255, (offset, (offset[0] + shape_surf.get_width(), offset[1] + shape_surf.get_height()))).blit(shape_surf, offset))
+
 
     def static_rectangle(self, color, width, height, top_left_corner_pos, rotation=0, alpha=255):
-        self._rectangle(self.static_surface, color, width, height, top_left_corner_pos, rotation=rotation, alpha=alpha)
+        self._rectangle(True, color, width, height, top_left_corner_pos, rotation=rotation, alpha=alpha)
 
 
     def rectangle(self, color, width, height, top_left_corner_pos, rotation=0, alpha=255):
-        self._rectangle(self.surface, color, width, height, top_left_corner_pos, rotation=rotation, alpha=alpha)
+        self._rectangle(False, color, width, height, top_left_corner_pos, rotation=rotation, alpha=alpha)
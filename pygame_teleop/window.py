@@ -1,18 +1,82 @@
+import math
+import collections
 import pygame
 import numpy
-from scipy.interpolate import interp1d
-from .viewer import Viewer
+from .viewer import Viewer, _draw_dashed_lines, _merge_rects, _union_rects
+from .ringbuffer import RingBuffer
+from .sprites import SpriteCache
 
 """
 Window implementations.
 
 Notes
-Every time you add a new Window sub-class, you need to update the
-Screen._init_windows method in the screen.py script - this is just a
-hard fact of life!
+Window sub-classes are registered with the register_window decorator,
+the 'type' of a window in a screen config is the registered name (the
+class name by default). Third-party packages can register windows
+through the 'pygame_teleop.windows' entry point group.
 """
 
 
+WINDOW_TYPES = {}
+ENTRY_POINT_GROUP = 'pygame_teleop.windows'
+_entry_points_loaded = False
+
+
+def register_window(cls=None, name=None):
+    """Registers a Window sub-class under name (default is the class name), can be used as a decorator."""
+    def register(cls):
+        WINDOW_TYPES[name or cls.__name__] = cls
+        return cls
+    return register if cls is None else register(cls)
+
+
+def _load_entry_points():
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    from importlib.metadata import entry_points
+    eps = entry_points()
+    group = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, 'select') else eps.get(ENTRY_POINT_GROUP, [])
+    for ep in group:
+        if ep.name not in WINDOW_TYPES:
+            register_window(ep.load(), name=ep.name)
+
+
+def get_window_type(name):
+    """Returns the Window sub-class registered under name, entry points are loaded on the first unknown name."""
+    if name not in WINDOW_TYPES:
+        _load_entry_points()
+    try:
+        return WINDOW_TYPES[name]
+    except KeyError:
+        raise ValueError(f"unknown window type '{name}', registered types are: {', '.join(sorted(WINDOW_TYPES))}") from None
+
+
+def _broadcast_colors(colors, n):
+    """Returns a list of n colors given a single color or a sequence of colors."""
+    if isinstance(colors, str) or (numpy.ndim(colors) == 1 and not isinstance(colors[0], str)):
+        return [pygame.Color(colors)]*n
+    return [pygame.Color(c) for c in colors]
+
+
+def _rgb(colors):
+    """Returns an n-by-3 float array given a sequence of colors (names, tuples, or pygame.Color)."""
+    if isinstance(colors, numpy.ndarray):
+        return colors[:, :3].astype(float)
+    return numpy.array([tuple(pygame.Color(c) if isinstance(c, str) else c)[:3] for c in colors], dtype=float)
+
+
+def _map_rgb(surface, rgb):
+    """Vectorized Surface.map_rgb, returns the (opaque) pixel values of an array of rgb colors with shape (..., 3)."""
+    rgb = numpy.clip(numpy.rint(rgb), 0, 255).astype(numpy.uint32)
+    masks, shifts, losses = surface.get_masks(), surface.get_shifts(), surface.get_losses()
+    pixels = numpy.full(rgb.shape[:-1], masks[3], dtype=numpy.uint32)
+    for i in range(3):
+        pixels |= ((rgb[..., i] >> losses[i]) << shifts[i]) & masks[i]
+    return pixels
+
+
 class Window(Viewer):
 
 
@@ -21,7 +85,9 @@ class Window(Viewer):
         # Initialize base class
         self.config = config
         self.z_order = config.get('zorder', 0)
-        Viewer.__init__(self, config['width'], config['height'], config['background_color'])
+        Viewer.__init__(self, config['width'], config['height'], config['background_color'], config.get('incremental_reset', False))
+        if config.get('sprite_cache', False):
+            self.sprite_cache = SpriteCache(config.get('sprite_cache_bytes', 8*1024*1024), config.get('sprite_cache_rotation_step', 1.0))
 
         # Initialize window
         self._post_init()
@@ -31,6 +97,20 @@ class Window(Viewer):
         pass
 
 
+    required_keys = ('width', 'height', 'background_color')
+
+
+    @classmethod
+    def validate_config(cls, config):
+        """Raises ValueError when config is not valid for this window, sub-classes extend this with their own checks."""
+        missing = [key for key in cls.required_keys if key not in config]
+        if missing:
+            raise ValueError(f"missing keys {missing}")
+        if config['width'] <= 0 or config['height'] <= 0:
+            raise ValueError("width and height must be positive")
+        pygame.Color(config['background_color'])  # raises ValueError for unknown colors
+
+
 class EnvironmentObject:
 
     def __init__(self, robotenv, config):
@@ -38,6 +118,524 @@ class EnvironmentObject:
         self.config = config
 
 
+class BackgroundLayer:
+
+    """Static surface of a RobotEnvironment with the grids and the trails without fade baked in.
+
+    RobotEnvironment.reset restores the environment surface from this
+    surface instead of the static surface, so baked layers cost nothing
+    per frame. New (opaque) trail segments are drawn straight onto it,
+    otherwise the regions changed by grid updates, trails dropping old
+    positions, or static drawing are recomposed from the static surface,
+    the grids and the trails (in that order, each from its own surface)
+    on the next reset, once per merged region.
+    """
+
+
+    def __init__(self, robotenv):
+        self.robotenv = robotenv
+        self.surface = robotenv.static_surface.copy()
+        self.grids = []  # GridLayer objects
+        self.trails = []  # TrailLayer objects without fade
+        self._pending = []  # regions to recompose, see update
+        robotenv._background = self.surface
+
+
+    def repair(self, rect):
+        """Recomposes rect on the next update."""
+        self._pending.append(rect)
+
+
+    def draw_line(self, color, start_pos, end_pos, width, rect):
+        """Bakes a new segment, drawn directly when it is opaque, rect is its bounds on the layer that owns it."""
+        if color.a == 255:
+            self.robotenv._mark_background_dirty(pygame.draw.line(self.surface, color, start_pos, end_pos, width))
+        else:
+            self.repair(rect)
+
+
+    def refresh(self):
+        self.repair(self.surface.get_rect())
+
+
+    def update(self):
+        """Recomposes the regions passed to repair, called by RobotEnvironment.reset."""
+        rects, self._pending = _merge_rects([rect.clip(self.surface.get_rect()) for rect in self._pending]), []
+        for layer in self.trails:
+            if layer._pending_rect is not None and layer._pending_rect.collidelist(rects) != -1:
+                layer._flush()
+        for rect in rects:
+            self.surface.blit(self.robotenv.static_surface, rect, rect)
+            for layer in self.grids + self.trails:
+                if layer.rect is not None:
+                    area = rect.clip(layer.rect)
+                    if area:
+                        self.surface.blit(layer.surface, area, area.move(-layer.area.x, -layer.area.y))
+            self.robotenv._mark_background_dirty(rect)
+
+
+class TrailLayer:
+
+    """Path trails of one or more robots on a cached surface.
+
+    The last max_length positions (in pygame coordinates) of each trail
+    are kept in a ring buffer and each new segment is drawn onto the
+    layer's own surface, which is allocated on the first segment and
+    only covers the trails (it grows as they do). Trails without fade
+    are baked into the environment's BackgroundLayer, so they cost
+    nothing on reset. With fade, the layer is blitted on every reset
+    and the alpha of the trails is multiplied by fade every frame so old
+    segments fade out, only positions that are still visible are kept.
+    The trails are redrawn from the ring buffer every rebuild_every
+    dropped positions, so the trail shows at most max_length +
+    rebuild_every positions (fewer with fade). Memory and per-frame cost
+    are constant however long the session is.
+    """
+
+
+    def __init__(self, robotenv, color='black', width=1, max_length=1000, fade=None, n=1, rebuild_every=None):
+        self.robotenv = robotenv
+        self.color = pygame.Color(color)
+        self.width = width
+        self.n = n
+        self.fade = fade
+        if fade is not None and 0.0 < fade < 1.0:
+            # Segments older than this have alpha*fade**age < 0.5
+            visible = int(math.log(0.5/max(self.color.a, 1))/math.log(fade)) + 2
+            max_length = min(max_length, max(2, visible))
+        self.rebuild_every = max(1, max_length//10) if rebuild_every is None else rebuild_every
+        self.positions = RingBuffer(max_length, shape=(n, 2), dtype=int)
+        self.rect = None  # bounds of the drawn trails
+        self._bounds = robotenv.static_surface.get_rect()
+        self._previous = None  # last position as a tuple of ints (n == 1), see append_one
+        self._pending = []  # positions added by append_one that are not in the ring buffer yet, see _flush
+        self._pending_rect = None  # bounds of the pending segments drawn on the background but not on the surface yet
+        self.surface = None  # allocated on the first segment, see _reserve
+        self.area = None  # region of the environment covered by surface
+        self._inner = None  # positions in here are at least width inside area, see append_one
+        self._baked = fade is None and self.color.a == 255  # segments go straight to the background, see _flush
+        if fade is None:
+            self.background = robotenv.get_background()
+            self.background.trails.append(self)
+            layers = self.background.trails
+        else:
+            self.background = None
+            robotenv.trails.append(self)
+            layers = robotenv.trails
+
+        # Positions dropped from the ring buffer since the last rebuild,
+        # layers created together (e.g. one per robot) start at different
+        # counts so they do not rebuild on the same frame
+        self._overflow = len(layers) % self.rebuild_every
+
+
+    def clear(self):
+        self.positions.clear()
+        self._pending = []
+        self._pending_rect = None
+        self._overflow = 0
+        self._previous = None
+        self.surface = None
+        self.area = None
+        self._inner = None
+        rect, self.rect = self.rect, None
+        if self.background is not None and rect is not None:
+            self.background.repair(rect)
+
+
+    def remove(self):
+        """Clears the trails and detaches the layer from the environment."""
+        self.clear()
+        if self.background is None:
+            self.robotenv.trails.remove(self)
+        else:
+            self.background.trails.remove(self)
+
+
+    def _segments_rect(self, points):
+        """Bounds of lines through points (an array with shape (..., 2)), padded by the line width."""
+        points = points.reshape(-1, 2)
+        x0, y0 = points.min(axis=0).tolist()
+        x1, y1 = points.max(axis=0).tolist()
+        return pygame.Rect(x0, y0, x1 - x0 + 1, y1 - y0 + 1).inflate(2*self.width, 2*self.width)
+
+
+    def _reserve(self, rect):
+        """Makes sure the surface covers rect, the surface grows (with a margin) towards rect and keeps what is drawn."""
+        rect = rect.clip(self._bounds)
+        if self.area is not None and self.area.contains(rect):
+            return
+        rect = rect.inflate(128, 128)
+        area = (rect if self.area is None else self.area.union(rect)).clip(self._bounds)
+        surface = pygame.Surface(area.size, pygame.SRCALPHA)
+        if self.surface is not None:
+            surface.blit(self.surface, (self.area.x - area.x, self.area.y - area.y), special_flags=pygame.BLEND_RGBA_ADD)  # exact copy onto the transparent surface
+        self.surface = surface
+        self.area = area
+        self._inner = area.inflate(-2*self.width, -2*self.width)
+
+
+    def append_one(self, position):
+        """Adds the next position of a single trail (n == 1), without NumPy overhead, position is (x, y) in pygame coordinates."""
+
+        x, y = position = (int(position[0]), int(position[1]))
+        previous = self._previous
+        self._previous = position
+        if len(self.positions) + len(self._pending) >= self.positions.capacity:
+            self._overflow += 1
+        self._pending.append(position)
+        if len(self._pending) >= self.rebuild_every:
+            self._flush()
+
+        # Fade
+        if self.fade is not None and self.rect is not None:
+            self.surface.fill((255, 255, 255, int(255*self.fade)), self.rect.move(-self.area.x, -self.area.y), special_flags=pygame.BLEND_RGBA_MULT)
+
+        if previous is None:
+            return
+
+        # Drop old positions
+        if self._overflow >= self.rebuild_every:
+            self._rebuild()
+            return
+
+        # Draw new segment
+        if self._baked:
+            rect = pygame.draw.line(self.background.surface, self.color, previous, position, self.width)
+            self.robotenv._mark_background_dirty(rect)
+            self._pending_rect = rect if self._pending_rect is None else self._pending_rect.union(rect)
+            return
+        px, py = previous
+        w = self.width
+        if self._inner is None or not (self._inner.collidepoint(position) and self._inner.collidepoint(previous)):
+            self._reserve(pygame.Rect(min(x, px) - w, min(y, py) - w, abs(x - px) + 1 + 2*w, abs(y - py) + 1 + 2*w))
+        ax, ay = self.area.topleft
+        rect = pygame.draw.line(self.surface, self.color, (px - ax, py - ay), (x - ax, y - ay), w).move(ax, ay)
+        self.rect = rect if self.rect is None else self.rect.union(rect)
+        if self.background is not None:
+            self.background.draw_line(self.color, previous, position, w, rect)
+
+
+    def append(self, positions):
+        """Adds the next position of every trail, positions has shape (n, 2) in pygame coordinates."""
+
+        if self.n == 1:
+            self.append_one(numpy.reshape(positions, 2).tolist())
+            return
+
+        positions = numpy.asarray(positions, dtype=int).reshape(self.n, 2)
+        previous = self.positions.view(1).copy()
+        if len(self.positions) == self.positions.capacity:
+            self._overflow += 1
+        self.positions.append(positions[None])
+
+        # Fade
+        if self.fade is not None and self.rect is not None:
+            self.surface.fill((255, 255, 255, int(255*self.fade)), self.rect.move(-self.area.x, -self.area.y), special_flags=pygame.BLEND_RGBA_MULT)
+
+        if previous.shape[0] == 0:
+            return
+
+        # Drop old positions
+        if self._overflow >= self.rebuild_every:
+            self._rebuild()
+            return
+
+        # Draw new segments
+        self._reserve(self._segments_rect(numpy.concatenate((previous[0], positions))))
+        x, y = self.area.topleft
+        rects = [pygame.draw.line(self.surface, self.color, start_pos, end_pos, self.width).move(x, y) for start_pos, end_pos in zip((previous[0] - (x, y)).tolist(), (positions - (x, y)).tolist())]
+        if self.background is not None:
+            for start_pos, end_pos, rect in zip(previous[0].tolist(), positions.tolist(), rects):
+                self.background.draw_line(self.color, start_pos, end_pos, self.width, rect)
+        if self.rect is not None:
+            rects.append(self.rect)
+        self.rect = _union_rects(rects)
+
+
+    def _flush(self, draw=True):
+        """Moves the pending positions into the ring buffer, baked segments are drawn onto the surface in one go (unless draw is False)."""
+        if not self._pending:
+            return
+        if self._pending_rect is not None and draw:
+            points = self.positions.view(1)[:, 0].tolist() + self._pending
+            self._reserve(self._pending_rect.inflate(2*self.width, 2*self.width))
+            ax, ay = self.area.topleft
+            rect = pygame.draw.lines(self.surface, self.color, False, [(x - ax, y - ay) for x, y in points], self.width).move(ax, ay)
+            self.rect = rect if self.rect is None else self.rect.union(rect)
+        self._pending_rect = None
+        self.positions.append(numpy.array(self._pending, dtype=int).reshape(-1, 1, 2))
+        self._pending = []
+
+
+    def _rebuild(self):
+        """Redraws the trails from the ring buffer, the surface shrinks to the remaining trails."""
+        self._overflow = 0
+        self._flush(draw=False)
+        if len(self.positions) < 2:
+            self.clear()
+            return
+        rect = self.rect
+        self.surface = None
+        self.area = None
+        self._reserve(self._segments_rect(self.positions.view()))
+        self.rect = self._draw_all()
+        if self.background is not None:
+            self.background.repair(_union_rects([r for r in (rect, self.rect) if r is not None]))
+
+
+    def _draw_all(self):
+        """Draws the trails in the ring buffer onto the surface, returns their bounds."""
+        data = self.positions.view() - self.area.topleft
+        if self.fade is None:
+            rects = [pygame.draw.lines(self.surface, self.color, False, data[:, i].tolist(), self.width) for i in range(self.n)]
+        else:
+            # Oldest segments first, each with the alpha of its age
+            color = pygame.Color(self.color)
+            rects = []
+            m = data.shape[0]
+            for k in range(m - 1):
+                color.a = int(round(self.color.a*self.fade**(m - 2 - k)))
+                if color.a == 0:
+                    continue
+                rects += [pygame.draw.line(self.surface, color, start_pos, end_pos, self.width) for start_pos, end_pos in zip(data[k].tolist(), data[k + 1].tolist())]
+        return _union_rects(rects).move(self.area.topleft) if rects else None
+
+
+    def draw(self):
+        """Blits the trails onto the environment surface (trails without fade are part of the background)."""
+        if self.background is None and self.rect is not None:
+            self.robotenv._mark_dirty(self.robotenv.surface.blit(self.surface, self.rect, self.rect.move(-self.area.x, -self.area.y)))
+
+
+class GridLayer:
+
+    """Occupancy grid or costmap drawn from a 2D array on a cached surface.
+
+    Cell values are mapped to colors through a 256 entry lookup table
+    written straight into the pixels of a grid sized surface (one pixel
+    per cell), which is then scaled into a preallocated surface that is
+    baked into the environment's BackgroundLayer (below the trails) on
+    every update, so it costs nothing per frame. values[i, j] is
+    the cell at origin + (i, j)*resolution in environment units. Integer
+    grids follow the occupancy convention, 0 (free) to 100 (occupied)
+    and -1 (or 255) unknown, float grids are scaled from value_range to
+    0..100 with NaN unknown. Alternatively, colors gives all 256 colors
+    of the lookup table.
+    """
+
+
+    def __init__(self, robotenv, shape, resolution, origin=(0.0, 0.0), free_color='white', occupied_color='black', unknown_color='grey', colors=None, value_range=(0.0, 100.0), alpha=255):
+        self.robotenv = robotenv
+        self.shape = nx, ny = tuple(int(n) for n in shape)
+        self.value_range = value_range
+
+        # Cells are stored in screen orientation, i.e. flipped when the
+        # environment axes point left/up, see RobotEnvironment._post_init
+        dx, dy = numpy.sign(robotenv.affine[[0, 1], [0, 1]]).astype(int)
+        self._flip = (slice(None, None, dx), slice(None, None, dy))
+        self.cells = pygame.Surface(self.shape, 0, 32)
+
+        # Setup scaled surface
+        corners = robotenv.convert_points([[origin[0], origin[0] + nx*resolution], [origin[1], origin[1] + ny*resolution]]).round().astype(int)
+        x0, y0 = corners.min(axis=1)
+        w, h = corners.max(axis=1) - corners.min(axis=1)
+        self.area = pygame.Rect(int(x0), int(y0), int(w), int(h))  # region of the environment covered by surface
+        self.rect = None  # set by the first update, see BackgroundLayer
+        if self.area.size == self.shape:
+            self.surface = self.cells
+        else:
+            self.surface = pygame.Surface(self.area.size, 0, self.cells)
+        self.surface.set_alpha(alpha if alpha < 255 else None)
+
+        # Source cell of each pixel, this matches pygame.transform.scale
+        # so partial updates are identical to a full update
+        self._xi = numpy.arange(w)*nx//w
+        self._yi = numpy.arange(h)*ny//h
+
+        self.set_colors(colors, free_color, occupied_color, unknown_color)
+        self.background = robotenv.get_background()
+        self.background.grids.append(self)
+
+
+    def set_colors(self, colors=None, free_color='white', occupied_color='black', unknown_color='grey'):
+        """Sets the lookup table, cells already drawn keep their colors until the next update."""
+        if colors is None:
+            free, occupied, unknown = _rgb([free_color, occupied_color, unknown_color])
+            rgb = free + numpy.clip(numpy.arange(256)/100.0, 0.0, 1.0)[:, None]*(occupied - free)
+            rgb[255] = unknown
+        else:
+            rgb = _rgb(colors)
+        assert len(rgb) == 256, "colors must have 256 entries"
+        self.lut = _map_rgb(self.cells, rgb)
+
+
+    def _index(self, values):
+        values = numpy.asarray(values)
+        if values.dtype == numpy.uint8:
+            return values
+        if values.dtype == numpy.int8:
+            return values.view(numpy.uint8)
+        if values.dtype.kind in 'iu':
+            return numpy.clip(values, -1, 255).astype(numpy.uint8)  # -1 wraps to 255
+        lo, up = self.value_range
+        scaled = numpy.subtract(values, lo, dtype=numpy.float32)
+        scaled *= 100.0/(up - lo)
+        numpy.clip(scaled, 0.0, 100.0, out=scaled)
+        scaled[numpy.isnan(scaled)] = 255
+        return scaled.astype(numpy.uint8)
+
+
+    def update(self, values, offset=(0, 0)):
+        """Updates the cells from values, a 2D array of the whole grid or of the sub-region starting at cell offset."""
+
+        index = self._index(values)
+        i0, j0 = offset
+        i1, j1 = i0 + index.shape[0], j0 + index.shape[1]
+        nx, ny = self.shape
+        assert 0 <= i0 and 0 <= j0 and i1 <= nx and j1 <= ny, "region is outside the grid"
+
+        # Map values into the cell pixels in place, the transposes make
+        # take write in the surface's (row major) memory order
+        cells = pygame.surfarray.pixels2d(self.cells)
+        numpy.take(self.lut, index.T, out=cells[self._flip][i0:i1, j0:j1].T, mode='clip')
+
+        # Pixel range showing the region in screen orientation
+        if self._flip[0].step < 0:
+            i0, i1 = nx - i1, nx - i0
+        if self._flip[1].step < 0:
+            j0, j1 = ny - j1, ny - j0
+
+        # Rescale
+        if self.surface is self.cells:
+            changed = pygame.Rect(i0, j0, i1 - i0, j1 - j0)
+        elif (i1 - i0, j1 - j0) == self.shape:
+            del cells
+            pygame.transform.scale(self.cells, self.area.size, self.surface)
+            changed = self.surface.get_rect()
+        else:
+            X0, X1 = numpy.searchsorted(self._xi, (i0, i1))
+            Y0, Y1 = numpy.searchsorted(self._yi, (j0, j1))
+            pixels = pygame.surfarray.pixels2d(self.surface)
+            pixels[X0:X1, Y0:Y1] = cells[self._xi[X0:X1, None], self._yi[None, Y0:Y1]]
+            del pixels
+            changed = pygame.Rect(int(X0), int(Y0), int(X1 - X0), int(Y1 - Y0))
+
+        # Bake into the background
+        self.rect = self.area
+        self.background.repair(changed.move(self.area.topleft))
+
+
+class ScanLayer:
+
+    """Range scans (e.g. from a 2D lidar) drawn as points written straight into the environment pixels.
+
+    Scans are given as a 2-by-N array of points, or as ranges and
+    angles (see update_polar), in the frame of a sensor at pose (x, y,
+    theta) in the environment. The points are transformed to pygame
+    coordinates in one matrix multiply and, on reset, written directly
+    into the pixels of the environment surface. The last history scans
+    are shown, older scans fade towards the background color by decay
+    per scan. Without intensities points have color, with intensities
+    (scaled from intensity_range) they are colored by a 256 entry
+    lookup table, a ramp from low_color to color by default.
+    """
+
+
+    def __init__(self, robotenv, color='red', low_color='blue', colors=None, intensity_range=(0.0, 1.0), history=1, decay=0.5, point_size=1):
+        self.robotenv = robotenv
+        self.intensity_range = intensity_range
+        self.history = history
+        self.decay = decay
+        self.point_size = point_size
+        self.recent = collections.deque(maxlen=history)  # (X, Y, index, rect) for each scan, oldest first
+        self.set_colors(color, low_color, colors)
+        robotenv.scans.append(self)
+
+
+    def set_colors(self, color='red', low_color='blue', colors=None):
+        """Sets the lookup tables, one for each age of scan."""
+        if colors is None:
+            low, high = _rgb([low_color, color])
+            rgb = low + numpy.linspace(0.0, 1.0, 256)[:, None]*(high - low)
+        else:
+            rgb = _rgb(colors)
+        assert len(rgb) == 256, "colors must have 256 entries"
+        background = _rgb([self.robotenv.config['background_color']])[0]
+        weights = (self.decay**numpy.arange(self.history))[:, None, None]
+        self.lut = _map_rgb(self.robotenv.static_surface, weights*rgb + (1.0 - weights)*background)
+
+
+    def clear(self):
+        self.recent.clear()
+
+
+    def _transform(self, pose):
+        """Returns the 2x3 affine matrix from the sensor frame to pygame coordinates."""
+        if pose is None:
+            return self.robotenv.affine
+        x, y, theta = pose
+        c, s = math.cos(theta), math.sin(theta)
+        return self.robotenv.affine @ numpy.array([[c, -s, x], [s, c, y], [0.0, 0.0, 1.0]])
+
+
+    def update(self, points, intensities=None, pose=None):
+        """Adds a scan, points is a 2-by-N array in the sensor frame (the environment frame when pose is None)."""
+
+        # Convert points in one pass
+        A = self._transform(pose)
+        P = numpy.rint(A[:, :2] @ numpy.asarray(points, dtype=float) + A[:, 2:]).astype(int)
+        P -= self.point_size//2  # top-left pixel of each point
+
+        # Drop points outside the surface
+        W, H = self.robotenv.static_surface.get_size()
+        X, Y = P
+        inside = (X >= 0) & (X <= W - self.point_size) & (Y >= 0) & (Y <= H - self.point_size)
+        X, Y = X[inside], Y[inside]
+
+        # Lookup table indices
+        if intensities is None:
+            index = numpy.full(X.shape, 255, dtype=numpy.uint8)
+        else:
+            lo, up = self.intensity_range
+            index = numpy.clip((numpy.asarray(intensities, dtype=float)[inside] - lo)*(255.0/(up - lo)), 0.0, 255.0).astype(numpy.uint8)
+
+        rect = None
+        if X.size > 0:
+            x0, y0 = int(X.min()), int(Y.min())
+            rect = pygame.Rect(x0, y0, int(X.max()) - x0 + self.point_size, int(Y.max()) - y0 + self.point_size)
+        self.recent.append((X, Y, index, rect))
+
+
+    def update_polar(self, ranges, angles, intensities=None, pose=None):
+        """Adds a scan given ranges and angles (arrays or angle, scalar ranges are broadcast), invalid ranges (inf/nan) are dropped."""
+        ranges, angles = numpy.broadcast_arrays(numpy.asarray(ranges, dtype=float), numpy.asarray(angles, dtype=float))
+        valid = numpy.isfinite(ranges)
+        ranges, angles = ranges[valid], angles[valid]
+        if intensities is not None:
+            intensities = numpy.asarray(intensities)[valid]
+        self.update(numpy.vstack((ranges*numpy.cos(angles), ranges*numpy.sin(angles))), intensities, pose)
+
+
+    def draw(self):
+        """Writes the scans into the environment surface, oldest first."""
+        if not self.recent:
+            return
+        pixels = pygame.surfarray.pixels2d(self.robotenv.surface)
+        rects = []
+        for age, (X, Y, index, rect) in zip(range(len(self.recent) - 1, -1, -1), self.recent):
+            if rect is None:
+                continue
+            colors = self.lut[age][index]
+            for dx in range(self.point_size):
+                for dy in range(self.point_size):
+                    pixels[X + dx, Y + dy] = colors
+            rects.append(rect)
+        del pixels
+        if rects:
+            self.robotenv._mark_dirty(_union_rects(rects))
+
+
 class Robot(EnvironmentObject):
 
 
@@ -47,26 +645,64 @@ class Robot(EnvironmentObject):
         self.robot_radius = robotenv.convert_scalar(self.config['robot_radius'])
         self.show_path = self.config.get('show_path', True)
         self.path_width = self.config.get('path_width', 1)
-        self.path_color = self.config.get('path_color', 'black')  # NOTE, if you can't see the path, is your background black?
+        self.path_color = pygame.Color(self.config.get('path_color', 'black'))  # NOTE, if you can't see the path, is your background black?
+        self.path_color.a = self.config.get('path_alpha', 255)
+        self.robot_alpha = self.config.get('robot_alpha', 255)
+        if self.show_path:
+            # Trails keep the last path_length positions, the layer's
+            # surface is only allocated once the robot moves
+            self.trail = TrailLayer(robotenv, self.path_color, self.path_width, self.config.get('path_length', 1000), self.config.get('path_fade'))
 
 
     def draw(self, x):
         x_use = self.robotenv.convert_position(x)
-        if (self.previous_position is not None) and self.show_path:
-            self.robotenv.static_line(self.path_color, self.previous_position, x_use, self.path_width)
-        self.robotenv.circle(self.config['robot_color'], x_use, self.robot_radius)
+        if self.show_path:
+            self.trail.append_one(x_use)  # shown from the next reset, see RobotEnvironment.reset
+        self.robotenv.circle(self.config['robot_color'], x_use, self.robot_radius, alpha=self.robot_alpha)
         self.previous_position = x_use
 
 
+@register_window
 class RobotEnvironment(Window):
 
     rotation_direction = {
         'lower_left': -1.0,
         'upper_left': 1.0,
         'lower_right': 1.0,
+        'upper_right': -1.0,
         'center': -1.0,
     }
 
+    # Direction of the x and y axes, and location of the origin as a
+    # fraction of the window width/height, for each origin location
+    origin_locations = {
+        'upper_left': (1.0, 1.0, 0.0, 0.0),
+        'lower_left': (1.0, -1.0, 0.0, 1.0),
+        'lower_right': (-1.0, -1.0, 1.0, 1.0),
+        'upper_right': (-1.0, 1.0, 1.0, 0.0),
+        'center': (1.0, -1.0, 0.5, 0.5),
+    }
+
+
+    required_keys = Window.required_keys + ('robotenv_width', 'robotenv_height')
+
+
+    @classmethod
+    def validate_config(cls, config):
+        super().validate_config(config)
+        w, h = float(config['robotenv_width']), float(config['robotenv_height'])
+        if w <= 0 or h <= 0:
+            raise ValueError("robotenv_width and robotenv_height must be positive")
+        if abs((w/h) - (float(config['width'])/float(config['height']))) >= 1e-5:
+            raise ValueError("aspect ratio is not consistent between pygame window and robot environment")
+        origin_location = config.get('robotenv_origin_location', 'upper_left')
+        if origin_location not in cls.origin_locations:
+            raise ValueError(f"robotenv_origin_location '{origin_location}' is not one of {', '.join(cls.origin_locations)}")
+        for name, robot in config.get('robots', {}).items():
+            missing = [key for key in ('robot_radius', 'robot_color') if key not in robot]
+            if missing:
+                raise ValueError(f"robot '{name}' is missing keys {missing}")
+
 
     def _post_init(self):
 
@@ -81,14 +717,25 @@ class RobotEnvironment(Window):
         self.W = W
         self.H = H
 
+        # Compile the transform from environment to pygame coordinates
+        # into a 2x3 affine matrix A, i.e. X = A[:, :2] @ x + A[:, 2],
+        # and its inverse
         self.robotenv_origin_location = self.config.get('robotenv_origin_location', 'upper_left')
-        self._convert_position = getattr(self, f'_convert_position_{self.robotenv_origin_location}')
-        self._revert_position = getattr(self, f"_revert_position_{self.robotenv_origin_location}")
-        if self.robotenv_origin_location == 'upper_right':
-            raise NotImplementedError("since this error was raised, there is now a need to implement upper_right use-case, see RobotEnvironment class.")
+        dx, dy, ox, oy = self.origin_locations[self.robotenv_origin_location]
+        self.affine = numpy.array([
+            [dx*W/w, 0.0, ox*W],
+            [0.0, dy*H/h, oy*H],
+        ])
+        self.affine_inv = numpy.linalg.inv(numpy.vstack((self.affine, [0.0, 0.0, 1.0])))[:2]
+        self._a = tuple(float(a) for a in self.affine[[0, 0, 1, 1], [0, 2, 1, 2]])  # scalar path, see _convert_position
+        self._a_inv = tuple(float(a) for a in self.affine_inv[[0, 0, 1, 1], [0, 2, 1, 2]])
 
         # Setup robots
+        self.background = None  # see get_background
+        self.trails = []  # TrailLayer objects with fade, drawn on reset
+        self.scans = []  # ScanLayer objects, drawn on reset above the trails
         self.robots = {name: Robot(self, config) for name, config in self.config.get('robots', {}).items()}
+        self.robots_trail = None  # see draw_robots
 
         # Include origin
         if self.config.get('show_origin', False):
@@ -99,34 +746,35 @@ class RobotEnvironment(Window):
             self.static_line('green', origin_center, self.convert_position((0, h*axis_scale)), width=line_width)  # y axis
             self.static_circle('blue', origin_center, self.convert_scalar(w*0.0175))
 
-    def _convert_position_center(self, x, y):
-        return (0.5*self.w+x)*self.W/self.w, (0.5*self.h-y)*self.H/self.h
+    def reset(self):
+        if self.background is not None:
+            if self._static_changed:
+                self.background.refresh()
+            self.background.update()
+        Window.reset(self)
+        for trail in self.trails:
+            trail.draw()
+        for scan in self.scans:
+            scan.draw()
 
-    def _revert_position_center(self, X, Y):
-        return (X*self.w/self.W) - 0.5*self.w, 0.5*self.h - Y*self.h/self.H
 
-    def _convert_position_upper_left(self, x, y):
-        return self.W*x/self.w, self.H*y/self.h
+    def get_background(self):
+        """Returns the BackgroundLayer, created on first use."""
+        if self.background is None:
+            self.background = BackgroundLayer(self)
+        return self.background
 
 
-    def _revert_position_upper_left(self, X, Y):
-        return self.w*X/self.W, self.h*Y/self.H
+    def _convert_position(self, x, y):
+        """Converts x, y (scalars or arrays) to pygame coordinates."""
+        ax, bx, ay, by = self._a
+        return ax*x + bx, ay*y + by
 
 
-    def _convert_position_lower_left(self, x, y):
-        return self.W*x/self.w, (self.H/self.h)*(self.h-y)
-
-
-    def _revert_position_lower_left(self, X, Y):
-        return self.w*X/self.W, self.h*(1.0-Y/self.H)
-
-
-    def _convert_position_lower_right(self, x, y):
-        return (self.W/self.w)*(self.w-x), (self.H/self.h)*(self.h-y)
-
-
-    def _revert_position_lower_right(self, x, y):
-        return self.w*(1.0-X/self.W), (self.H/self.h)*(self.h-y)
+    def _revert_position(self, X, Y):
+        """Converts X, Y (scalars or arrays) in pygame coordinates to the environment."""
+        ax, bx, ay, by = self._a_inv
+        return ax*X + bx, ay*Y + by
 
 
     def convert_scalar(self, s):
@@ -140,27 +788,62 @@ class RobotEnvironment(Window):
         return int(round(X)), int(round(Y))
 
 
+    def revert_scalar(self, S):
+        return float(S)/self.k
+
+
     def revert_position(self, pos):
         return self._revert_position(float(pos[0]), float(pos[1]))
 
 
-    def convert_path(self, path):
+    def convert_points(self, points):
+        """Converts a 2-by-N array of positions to (unrounded) pygame coordinates in one matrix multiply."""
+        return self.affine[:, :2] @ numpy.asarray(points, dtype=float) + self.affine[:, 2:]
+
 
-        # Extract x, y and ensure float type
-        x = path[0,:].astype(float)
-        y = path[1,:].astype(float)
+    def revert_points(self, points):
+        """Converts a 2-by-N array of pygame coordinates to environment positions."""
+        return self.affine_inv[:, :2] @ numpy.asarray(points, dtype=float) + self.affine_inv[:, 2:]
 
-        # Convert position
-        X, Y = self._convert_position(x, y)
 
-        return numpy.stack((X, Y)).round().astype(int)
+    def convert_path(self, path):
+        return self.convert_points(path).round().astype(int)
 
 
-    def draw_path(self, color, path, width=1, dashed=False):
+    def draw_path(self, color, path, width=1, dashed=False, alpha=255):
         if dashed:
-            self.dashed_lines(color, self.convert_path(path).T.tolist(), width)
+            self.dashed_lines(color, self.convert_path(path).T.tolist(), width, alpha=alpha)
         else:
-            self.lines(color, self.convert_path(path).T.tolist(), width)
+            self.lines(color, self.convert_path(path).T.tolist(), width, alpha=alpha)
+
+
+    def draw_robots(self, positions, colors, radii, path_color=None, path_width=1, path_length=1000, path_fade=None, alpha=255):
+        """Draws many robots at once. The positions are given as a 2-by-N array, colors can be a single color or one for each robot, and radii a scalar or an array of length N (both in environment units). When path_color is given the paths of all robots are kept in one TrailLayer."""
+
+        # Convert positions and radii in one pass
+        X = self.convert_path(numpy.asarray(positions)).T.tolist()
+        n = len(X)
+        R = numpy.broadcast_to(self.k*numpy.asarray(radii, dtype=float), (n,)).round().astype(int).tolist()
+        C = _broadcast_colors(colors, n)
+        for c in C:
+            c.a = alpha
+
+        # Update paths
+        if path_color is not None:
+            if (self.robots_trail is None) or (self.robots_trail.n != n):
+                if self.robots_trail is not None:
+                    self.robots_trail.remove()
+                self.robots_trail = TrailLayer(self, path_color, path_width, path_length, path_fade, n=n)
+            self.robots_trail.append(X)
+
+        # Draw robots
+        a = alpha if self.sprite_cache is None else 255  # sprites are blended when blitted
+        surface = self._begin(False, a)
+        end = self._end
+        circle = pygame.draw.circle if self.sprite_cache is None else self._circle
+        for color, center, radius in zip(C, X, R):
+            end(False, a, circle(surface, color, center, radius))
+
 
     def draw_box(self, color, width, height, center_pos, rotation=0, alpha=255):
         r = self.rotation_direction[self.robotenv_origin_location]*numpy.rad2deg(rotation)
@@ -172,9 +855,17 @@ class RobotEnvironment(Window):
         return self.revert_position((xscreen - self.config['origin'][0], yscreen - self.config['origin'][1]))
 
 
+@register_window
 class Joystick(Window):
 
 
+    @classmethod
+    def validate_config(cls, config):
+        super().validate_config(config)
+        if config['width'] != config['height']:
+            raise ValueError("width and height must be the same for Joystick")
+
+
     def _post_init(self):
 
         # Check dimensions
@@ -231,21 +922,189 @@ class Joystick(Window):
         self.circle(self.joy_tip_color, pos, self.tip_radius)
 
 
+@register_window
 class TimeSeries(Window):
 
+    required_keys = Window.required_keys + ('tp', 'tf', 'y_lo', 'y_up')
+
+
+    @classmethod
+    def validate_config(cls, config):
+        super().validate_config(config)
+        if float(config['tp']) + float(config['tf']) <= 0:
+            raise ValueError("tp + tf must be positive")
+        if abs(config['y_lo']) + abs(config['y_up']) <= 0:
+            raise ValueError("y_lo and y_up can't both be zero")
+
 
     def _post_init(self):
         self.n = self.config.get('n', 50)
+        tp = float(self.config['tp'])
+        tf = float(self.config['tf'])
+        W = float(self.config['width'])
+        M = int(round(tp*W/(tp+tf)))
         if self.config.get('show_axis', True):
             axis_width = self.config.get('axis_width', 1)
             axis_color = self.config.get('axis_color', 'black')
             self.static_line(axis_color, (0, self.config['height']/2), (self.config['width'], self.config['height']/2), axis_width)
-            tp = float(self.config['tp'])
-            tf = float(self.config['tf'])
-            W = float(self.config['width'])
-            M = int(round(tp*W/(tp+tf)))
             self.static_line(axis_color, (M, 0), (M, self.config['height']), axis_width)
 
+        # Setup streaming, see push and plot_stream. Each channel
+        # keeps the samples of the last tp seconds in a ring buffer
+        # sized for the expected rate stream_hz (it grows when samples
+        # arrive faster), they are resampled onto n points spanning
+        # [-tp, 0] relative to the latest sample.
+        stream_hz = float(self.config.get('stream_hz', 100.0))
+        self.stream_capacity = self.config.get('stream_capacity', int(math.ceil(stream_hz*tp)) + 2)
+        self.streams = {}
+        self.stream_time = None  # time of the latest pushed sample
+        self._stream_grid = numpy.linspace(-tp, 0.0, self.n)
+        self._stream_T = self._convert_t(self._stream_grid)
+
+        # Setup scroll mode, the plot is kept on its own surface that
+        # is shifted left by the elapsed time on each reset so only
+        # the newest samples are rasterized. The static surface is
+        # used as a color-keyed layer to re-stamp the axis on top.
+        self.scroll = self.config.get('scroll', False)
+        if self.scroll:
+            self._M = M
+            self._pixels_per_second = W/(tp + tf)
+            self._scroll_surface = pygame.Surface(self.static_surface.get_size())
+            self._scroll_surface.fill(self.background_color)
+            self._scroll_time = None  # time at pixel column M
+            self._scroll_last = {}  # time of the last sample drawn for each channel
+            self.static_surface.set_colorkey(self.background_color, pygame.RLEACCEL)
+
+
+    def reset(self):
+
+        if not self.scroll:
+            Window.reset(self)
+            return
+
+        # Scroll plot
+        self.dirty_rects = []
+        if self._scroll():
+            self.dirty_rects.append(self._scroll_surface.get_rect())
+
+        # Compose plot and static layer
+        if self.surface is None:
+            self.surface = self._scroll_surface.copy()
+        else:
+            self.surface.blit(self._scroll_surface, (0, 0))
+        self.surface.blit(self.static_surface, (0, 0))
+
+
+    def _scroll(self):
+        """Shifts the plot surface left by the whole number of pixels elapsed since the last scroll, returns True when it moved."""
+
+        if self._scroll_time is None:
+            return False
+
+        dx = int((self.stream_time - self._scroll_time)*self._pixels_per_second)
+        if dx <= 0:
+            return False
+        self._scroll_time += dx/self._pixels_per_second
+
+        # Shift and clear the exposed strip
+        W, H = self._scroll_surface.get_size()
+        self._scroll_surface.scroll(-dx, 0)
+        self._scroll_surface.fill(self.background_color, (max(W - dx, 0), 0, min(dx, W), H))
+
+        return True
+
+
+    def _plot_stream_tail(self, channel, color, line_width, dashed, dash_length):
+        """Rasterizes the samples pushed since the last call onto the plot surface (scroll mode)."""
+
+        # Select new samples, including the last drawn one so the line is continuous
+        data = self.streams[channel].view()
+        last = self._scroll_last.get(channel)
+        i = 0 if last is None else max(numpy.searchsorted(data[:, 0], last, side='right') - 1, 0)
+        tail = data[i:]
+        if tail.shape[0] < 2:
+            return
+        self._scroll_last[channel] = tail[-1, 0]
+
+        # Convert to pygame coordinates
+        T = (self._M + (tail[:, 0] - self._scroll_time)*self._pixels_per_second).round().astype(int)
+        points = numpy.stack((T, self._convert_y(tail[:, 1]))).T.tolist()
+
+        # Draw on plot surface, then update surface and re-stamp the static layer
+        if dashed:
+            rect = _draw_dashed_lines(self._scroll_surface, color, points, line_width, dash_length)
+        else:
+            rect = pygame.draw.lines(self._scroll_surface, pygame.Color(color), False, points, line_width)
+        self.surface.blit(self._scroll_surface, rect, rect)
+        self.surface.blit(self.static_surface, rect, rect)
+        self._mark_dirty(rect)
+
+
+    def _convert_t(self, t):
+        t = (t + self.config['tp']) / (self.config['tp'] + self.config['tf'])
+        return (self.config['width']*t).round().astype(int)
+
+
+    def _convert_y(self, y):
+        y = (y + abs(self.config['y_lo'])) / (abs(self.config['y_lo']) + abs(self.config['y_up']))
+        return (self.config['height']*y).round().astype(int)
+
+
+    def push(self, channel, t, y):
+        """Appends samples (scalars or arrays, in increasing time) to a channel of the stream."""
+        t = numpy.atleast_1d(numpy.asarray(t, dtype=float))
+        y = numpy.atleast_1d(numpy.asarray(y, dtype=float))
+        if channel not in self.streams:
+            self.streams[channel] = RingBuffer(self.stream_capacity, shape=(2,))
+        buffer = self.streams[channel]
+
+        # Grow the buffer when samples arrive faster than stream_hz,
+        # i.e. when the append would drop samples of the last tp seconds
+        n, capacity = len(buffer), buffer.capacity
+        if n + t.size > capacity:
+            data = buffer.view()
+            oldest = t[t.size - capacity] if t.size >= capacity else data[n + t.size - capacity, 0]
+            t_lo = t[-1] - float(self.config['tp'])
+            if oldest > t_lo:
+                needed = n - numpy.searchsorted(data[:, 0], t_lo) + t.size
+                buffer = RingBuffer(max(2*capacity, 2*needed), shape=(2,))
+                buffer.append(data)
+                self.streams[channel] = buffer
+
+        buffer.append(numpy.stack((t, y), axis=1))
+        if (self.stream_time is None) or (t[-1] > self.stream_time):
+            self.stream_time = t[-1]
+        if self.scroll and self._scroll_time is None:
+            self._scroll_time = self.stream_time  # see _scroll
+
+
+    def plot_stream(self, channel, color, line_width=1, dashed=False, dash_length=10):
+        """Plots the buffered samples of a channel, the latest pushed sample (on any channel) is at t=0."""
+
+        if self.scroll:
+            self._plot_stream_tail(channel, color, line_width, dashed, dash_length)
+            return
+
+        data = self.streams[channel].view()
+        if data.shape[0] < 2:
+            return
+
+        # Resample onto the part of the grid covered by the data
+        t = data[:, 0] - self.stream_time
+        i0 = numpy.searchsorted(self._stream_grid, t[0])
+        i1 = numpy.searchsorted(self._stream_grid, t[-1], side='right')
+        if i1 - i0 < 2:
+            return
+        y_use = numpy.interp(self._stream_grid[i0:i1], t, data[:, 1])
+
+        points = numpy.stack((self._stream_T[i0:i1], self._convert_y(y_use))).T.tolist()
+
+        # Draw
+        if dashed:
+            self.dashed_lines(color, points, width=line_width, dash_length=dash_length)
+        else:
+            self.lines(color, points, width=line_width)
+
 
     def plot_point(self, t, y, color, radius=2):
 
@@ -262,26 +1121,52 @@ class TimeSeries(Window):
 
     def plot_line(self, t, y, color, line_width=1, dashed=False, dash_length=10):
 
-        # Interpolate data
-        yfun = interp1d(t, y, bounds_error=False, fill_value='extrapolate')
+        # Sort data, note the downsampled times are always inside the
+        # data range so no extrapolation is required
+        if numpy.any(numpy.diff(t) < 0):
+            order = numpy.argsort(t)
+            t, y = t[order], y[order]
 
         # Downsample data
         t_lo = max(t.min(), -self.config['tp'])
         t_up = min(t.max(), self.config['tf'])
         t_use = numpy.linspace(t_lo, t_up, self.n)
-        y_use = yfun(t_use)
+        y_use = numpy.interp(t_use, t, y)
 
         # Convert to pygame coordinates
-        t_use = (t_use + self.config['tp']) / (self.config['tp'] + self.config['tf'])
-        T = (self.config['width']*t_use).round().astype(int)
-
-        y_use = (y_use + abs(self.config['y_lo'])) / (abs(self.config['y_lo']) + abs(self.config['y_up']))
-        Y = (self.config['height']*y_use).round().astype(int)
-
-        points = numpy.stack((T, Y)).T.tolist()
+        points = numpy.stack((self._convert_t(t_use), self._convert_y(y_use))).T.tolist()
 
         # Draw
         if dashed:
             self.dashed_lines(color, points, width=line_width, dash_length=dash_length)
         else:
             self.lines(color, points, width=line_width)
+
+
+    def plot_lines(self, t, Y, colors, line_width=1):
+        """Plots several channels sampled at the same (increasing) times t, Y has shape (channels, samples). When there are more samples than pixel columns, each column is reduced to the min/max envelope of its samples so spikes remain visible."""
+
+        t = numpy.asarray(t, dtype=float)
+        Y = numpy.atleast_2d(numpy.asarray(Y, dtype=float))
+
+        # Select samples inside the plot
+        i0 = numpy.searchsorted(t, -self.config['tp'])
+        i1 = numpy.searchsorted(t, self.config['tf'], side='right')
+        if i1 - i0 < 2:
+            return
+        t = t[i0:i1]
+        Y = Y[:, i0:i1]
+
+        # Decimate, min/max for each pixel column
+        T = self._convert_t(t)
+        starts = numpy.flatnonzero(numpy.r_[True, T[1:] != T[:-1]])
+        if starts.size < T.size:
+            Y_lo = numpy.minimum.reduceat(Y, starts, axis=1)
+            Y_up = numpy.maximum.reduceat(Y, starts, axis=1)
+            Y = numpy.stack((Y_lo, Y_up), axis=2).reshape(Y.shape[0], -1)
+            T = numpy.repeat(T[starts], 2)
+
+        # Draw
+        T = T.tolist()
+        for color, Ypix in zip(_broadcast_colors(colors, Y.shape[0]), self._convert_y(Y).tolist()):
+            self._mark_dirty(pygame.draw.lines(self.surface, color, False, list(zip(T, Ypix)), line_width))
@@ -0,0 +1,41 @@
+from pygame_teleop.joystick import JoystickSampler
+
+
+class FakeJoystick:
+
+    def __init__(self):
+        self.axes = [0.0, 0.0]
+        self.buttons = [0]
+
+    def get_axes(self):
+        return list(self.axes)
+
+    def get_buttons(self):
+        return list(self.buttons)
+
+
+def test_sample_only_changes_with_state():
+    joystick = FakeJoystick()
+    sampler = JoystickSampler(joystick)
+    first = sampler.poll()
+    assert sampler.poll() is first
+    assert sampler.last_poll >= first.time
+    joystick.axes[0] = 0.5
+    second = sampler.poll()
+    assert second.axes == (0.5, 0.0) and second.time >= first.time
+    assert sampler.poll() is second
+    joystick.buttons[0] = 1
+    assert sampler.poll().buttons == (1,)
+
+
+def test_filter_settles():
+    joystick = FakeJoystick()
+    sampler = JoystickSampler(joystick, filter_alpha=0.5)
+    sampler.poll()
+    joystick.axes[0] = 1.0
+    assert sampler.poll().axes[0] == 0.5
+    assert sampler.poll().axes[0] == 0.75
+    for _ in range(30):
+        sample = sampler.poll()
+    assert sample.axes == (1.0, 0.0)
+    assert sampler.poll() is sample
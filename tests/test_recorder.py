@@ -0,0 +1,22 @@
+import numpy
+import pygame
+import pytest
+from pygame_teleop.recorder import FrameRecorder
+
+
+@pytest.mark.parametrize('depth', [24, 32])
+def test_npz_frames(tmp_path, depth):
+    surface = pygame.Surface((8, 6), 0, depth)
+    filename = str(tmp_path/'frames')
+    recorder = FrameRecorder(filename, surface, pool_size=2, format='npz', chunk_size=6)
+    recorder.start()
+    reds = list(range(0, 240, 40))
+    for red in reds:
+        surface.fill((red, 10, 20))
+        while not recorder.record(surface):
+            pass  # wait for a free buffer
+    recorder.stop()
+    frames = numpy.load(filename + '_00000.npz')['frames']
+    assert frames.shape == (6, 6, 8, 3)
+    assert frames[:, :, :, 0].tolist() == [[[red]*8]*6 for red in reds]
+    assert (frames[:, :, :, 1:] == (10, 20)).all()
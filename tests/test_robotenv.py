@@ -0,0 +1,74 @@
+import numpy
+import pytest
+from pygame_teleop.window import RobotEnvironment
+
+
+ORIGIN_LOCATIONS = ['upper_left', 'lower_left', 'lower_right', 'upper_right', 'center']
+
+# Expected pygame position of the environment origin, and direction of
+# the environment x and y axes in pygame coordinates
+EXPECTED = {
+    'upper_left': ((0, 0), (1, 1)),
+    'lower_left': ((0, 200), (1, -1)),
+    'lower_right': ((300, 200), (-1, -1)),
+    'upper_right': ((300, 0), (-1, 1)),
+    'center': ((150, 100), (1, -1)),
+}
+
+
+def make_robotenv(origin_location):
+    return RobotEnvironment({
+        'width': 300,
+        'height': 200,
+        'background_color': 'white',
+        'origin': (0, 0),
+        'robotenv_width': 3.0,
+        'robotenv_height': 2.0,
+        'robotenv_origin_location': origin_location,
+    })
+
+
+@pytest.mark.parametrize('origin_location', ORIGIN_LOCATIONS)
+def test_origin_and_axes(origin_location):
+    robotenv = make_robotenv(origin_location)
+    (X0, Y0), (dx, dy) = EXPECTED[origin_location]
+    assert robotenv.convert_position((0.0, 0.0)) == (X0, Y0)
+    assert robotenv.convert_position((1.0, 0.0)) == (X0 + dx*100, Y0)
+    assert robotenv.convert_position((0.0, 1.0)) == (X0, Y0 + dy*100)
+
+
+@pytest.mark.parametrize('origin_location', ORIGIN_LOCATIONS)
+def test_points_round_trip(origin_location):
+    robotenv = make_robotenv(origin_location)
+    points = numpy.random.default_rng(0).uniform(-3.0, 3.0, size=(2, 1000))
+    numpy.testing.assert_allclose(robotenv.revert_points(robotenv.convert_points(points)), points, rtol=0.0, atol=1e-12)
+    pixels = numpy.random.default_rng(1).uniform(-300.0, 300.0, size=(2, 1000))
+    numpy.testing.assert_allclose(robotenv.convert_points(robotenv.revert_points(pixels)), pixels, rtol=0.0, atol=1e-10)
+
+
+@pytest.mark.parametrize('origin_location', ORIGIN_LOCATIONS)
+def test_position_round_trip(origin_location):
+    robotenv = make_robotenv(origin_location)
+    for X in range(0, 301, 7):
+        for Y in range(0, 201, 7):
+            assert robotenv.convert_position(robotenv.revert_position((X, Y))) == (X, Y)
+    for pos in numpy.random.default_rng(2).uniform(-1.5, 3.0, size=(100, 2)):
+        numpy.testing.assert_allclose(robotenv.revert_position(robotenv.convert_position(pos)), pos, rtol=0.0, atol=0.5/robotenv.k + 1e-12)
+
+
+@pytest.mark.parametrize('origin_location', ORIGIN_LOCATIONS)
+def test_position_matches_points(origin_location):
+    robotenv = make_robotenv(origin_location)
+    points = numpy.random.default_rng(3).uniform(-3.0, 3.0, size=(2, 100))
+    assert robotenv.convert_path(points).T.tolist() == [list(robotenv.convert_position(pos)) for pos in points.T]
+    pixels = robotenv.convert_points(points)
+    numpy.testing.assert_allclose(numpy.array([robotenv.revert_position(pos) for pos in pixels.T]).T, robotenv.revert_points(pixels), rtol=0.0, atol=1e-12)
+
+
+@pytest.mark.parametrize('origin_location', ORIGIN_LOCATIONS)
+def test_scalar_round_trip(origin_location):
+    robotenv = make_robotenv(origin_location)
+    for S in range(0, 301):
+        assert robotenv.convert_scalar(robotenv.revert_scalar(S)) == S
+    for s in numpy.linspace(0.0, 3.0, 101):
+        assert abs(robotenv.revert_scalar(robotenv.convert_scalar(s)) - s) <= 0.5/robotenv.k + 1e-12
@@ -0,0 +1,34 @@
+import pygame
+from pygame_teleop.viewer import Viewer
+
+
+def make_viewer():
+    viewer = Viewer(20, 10, 'white')
+    viewer.reset()
+    return viewer
+
+
+def test_opaque_drawn_over_translucent():
+    viewer = make_viewer()
+    viewer.rectangle('red', 10, 10, (5, 5), alpha=128)
+    viewer.rectangle('blue', 4, 4, (5, 5))
+    viewer.flush()
+    assert viewer.surface.get_at((5, 5)) == pygame.Color('blue')
+    assert viewer.surface.get_at((1, 1)) == pygame.Color(255, 127, 127)
+
+
+def test_translucent_drawn_over_opaque():
+    viewer = make_viewer()
+    viewer.rectangle('blue', 4, 4, (5, 5))
+    viewer.rectangle('red', 10, 10, (5, 5), alpha=128)
+    viewer.flush()
+    assert viewer.surface.get_at((5, 5)) == pygame.Color(128, 0, 127)
+
+
+def test_translucent_kept_pending_away_from_opaque():
+    viewer = make_viewer()
+    viewer.rectangle('red', 5, 5, (0, 0), alpha=128)
+    viewer.circle('blue', (15, 5), 2)
+    assert viewer.surface.get_at((2, 2)) == pygame.Color('white')
+    viewer.flush()
+    assert viewer.surface.get_at((2, 2)) == pygame.Color(255, 127, 127)